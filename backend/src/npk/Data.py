@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List
 
 class Cdata(BaseModel):
     N: float  # Nitrogen content in soil
@@ -8,3 +9,14 @@ class Cdata(BaseModel):
     Humidity: float  # Humidity (%)
     PH: float  # pH level of the soil
     Rain: float  # Rainfall (mm)
+
+
+class SweepAxis(BaseModel):
+    field: str  # Cdata field to vary, e.g. "N"
+    start: float
+    stop: float  # Inclusive upper bound
+    step: float
+
+class SweepRequest(BaseModel):
+    base: Cdata  # Values for the fields that stay fixed
+    axes: List[SweepAxis]  # One to three axes
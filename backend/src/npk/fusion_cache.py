@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def upload_digest(contents) -> str:
+    """
+    Content address of an upload: SHA-256 over the SHA-256 of each file, in order.
+    """
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+
+class FusionCache:
+    """
+    LRU cache of PreparedSeries keyed by upload_digest, bounded by the total
+    bytes of the cached arrays rather than the entry count. Safe to share
+    between request threads.
+    """
+
+    def __init__(self, maxbytes: int = 256 * 1024 * 1024):
+        self.maxbytes = maxbytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped on clear() so series predicted with an old corr_model are not stored
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, generation: int = None):
+        size = value.nbytes
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if size > self.maxbytes:
+                return
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.maxbytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bytes": self.nbytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
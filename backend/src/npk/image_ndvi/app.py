@@ -1,7 +1,10 @@
 import os
 import io
+import shutil
+import tempfile
 import base64
 from typing import List, Optional
+from pathlib import Path
 from pydantic import BaseModel
 import torch
 import torch.nn as nn
@@ -10,6 +13,8 @@ from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from PIL import Image
 from torchvision import transforms
+from npk.model_registry import registry
+from npk.offload import cpu_executor
 
 # Create FastAPI app
 app = FastAPI(title="SAR to Optical Image Converter")
@@ -77,10 +82,39 @@ class UNetGenerator(nn.Module):
         x = self.decoder(x)
         return x
 
+MODEL_PATH = os.getenv("GENERATOR_MODEL_PATH", str(Path(__file__).parent / "generator.pth"))
+
+# Memory-map CPU weights so forked workers share the pages (MMAP_WEIGHTS=0 to disable)
+MMAP_WEIGHTS = os.getenv("MMAP_WEIGHTS", "1") == "1"
+
+def load_generator(path):
+    generator = UNetGenerator().to(device)
+    if MMAP_WEIGHTS and device.type == "cpu":
+        # Map a private snapshot, never path itself: updating path in place
+        # (cp new.pth generator.pth) truncates it first, and a live model
+        # mapping those pages would die with SIGBUS on its next request
+        snapshot = None
+        try:
+            fd, snapshot = tempfile.mkstemp(prefix=".generator-", suffix=".pth", dir=os.path.dirname(os.path.abspath(path)))
+            os.close(fd)
+            shutil.copyfile(path, snapshot)
+            # assign=True keeps the mapped tensors instead of copying them into the module
+            generator.load_state_dict(torch.load(snapshot, map_location=device, mmap=True), assign=True)
+            generator.eval()
+            return generator
+        except (TypeError, RuntimeError, OSError) as e:
+            # Older torch, a legacy-format checkpoint or a read-only model directory
+            print(f"Loading {path} without mmap: {e}")
+        finally:
+            # The mapping keeps the unlinked snapshot alive until the model is dropped
+            if snapshot is not None:
+                os.unlink(snapshot)
+    generator.load_state_dict(torch.load(path, map_location=device))
+    generator.eval()
+    return generator
+
 # Load the trained Generator model
-generator = UNetGenerator().to(device)
-generator.load_state_dict(torch.load("src/npk/image_ndvi/generator.pth", map_location=device))
-generator.eval()
+registry.register("generator", MODEL_PATH, load_generator)
 
 # Pydantic models for response
 class PixelStats(BaseModel):
@@ -95,11 +129,13 @@ class ProcessedImageResponse(BaseModel):
     mean_ndvi: float
     pixel_stats: List[PixelStats]
 
-async def process_image(image: Image.Image) -> tuple[str, float, float, float, List[dict]]:
+# Blocking torch and PIL work; handlers run it on the offload executor
+def process_image(image: Image.Image) -> tuple[str, float, float, float, List[dict]]:
     try:
         sar_image = image.convert("L")
         sar_image = transform(sar_image).unsqueeze(0).to(device)
 
+        generator = registry.get("generator")
         with torch.no_grad():
             generated_optical = generator(sar_image)
 
@@ -110,7 +146,8 @@ async def process_image(image: Image.Image) -> tuple[str, float, float, float, L
         output_path = os.path.join(OUTPUT_FOLDER, "generated_ndvi.png")
         generated_optical.save(output_path)
 
-        min_ndvi, max_ndvi, mean_ndvi, pixel_stats = compute_ndvi(output_path)
+        # Stats from the in-memory image: concurrent requests share output_path
+        min_ndvi, max_ndvi, mean_ndvi, pixel_stats = ndvi_stats(generated_optical)
 
         buffered = io.BytesIO()
         generated_optical.save(buffered, format="PNG")
@@ -122,9 +159,11 @@ async def process_image(image: Image.Image) -> tuple[str, float, float, float, L
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 def compute_ndvi(image_path: str) -> tuple[float, float, float, List[dict]]:
+    return ndvi_stats(Image.open(image_path))
+
+def ndvi_stats(image: Image.Image) -> tuple[float, float, float, List[dict]]:
     try:
-        image = Image.open(image_path).convert("L")
-        ndvi_array = np.array(image)
+        ndvi_array = np.array(image.convert("L"))
         
         ndvi_array = ndvi_array / 127.5 - 1
 
@@ -159,7 +198,7 @@ async def process_uploaded_image(file: UploadFile = File(...)):
         image = Image.open(io.BytesIO(image_data))
         
         # Process the image
-        generated_image_base64, min_ndvi, max_ndvi, mean_ndvi, pixel_stats = await process_image(image)
+        generated_image_base64, min_ndvi, max_ndvi, mean_ndvi, pixel_stats = await cpu_executor.run(process_image, image)
         
         return ProcessedImageResponse(
             generated_image=generated_image_base64,
@@ -168,6 +207,8 @@ async def process_uploaded_image(file: UploadFile = File(...)):
             mean_ndvi=mean_ndvi,
             pixel_stats=[PixelStats(**stats) for stats in pixel_stats]
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
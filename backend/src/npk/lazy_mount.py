@@ -0,0 +1,97 @@
+import sys
+import time
+import logging
+import importlib
+import threading
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+class LazyApp:
+    """
+    ASGI app that imports the module holding a sub-application on its first
+    request (or on load()) and forwards every request to it afterwards.
+    """
+
+    def __init__(self, module: str, attribute: str = "app"):
+        self.module = module
+        self.attribute = attribute
+        self.load_seconds = None
+        # Top-level packages first imported by this sub-app, e.g. torch
+        self.imported_packages = []
+        self._app = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._app is not None
+
+    def load(self):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    already_imported = set(sys.modules)
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.module)
+                    self.load_seconds = time.perf_counter() - started
+                    self.imported_packages = sorted(
+                        {name.split(".")[0] for name in set(sys.modules) - already_imported} - {"npk"}
+                    )
+                    self._app = getattr(module, self.attribute)
+                    # The startup breakdown only lists lazy sub-apps, so report
+                    # the import time here, when it is actually paid
+                    logger.info(
+                        f"Imported {self.module} in {self.load_seconds:.2f}s"
+                        f" (new packages: {', '.join(self.imported_packages) or 'none'})"
+                    )
+        return self._app
+
+    async def __call__(self, scope, receive, send):
+        app = self._app
+        if app is None:
+            try:
+                # Imports can take seconds, keep them off the event loop
+                app = await run_in_threadpool(self.load)
+            except Exception as e:
+                logger.error(f"Error loading {self.module}: {str(e)}")
+                if scope["type"] != "http":
+                    raise
+                response = JSONResponse(
+                    status_code=503,
+                    content={"detail": f"Service {self.module} is unavailable: {str(e)}"}
+                )
+                await response(scope, receive, send)
+                return
+        await app(scope, receive, send)
+
+
+def warmup(sub_apps: dict, paths=None) -> dict:
+    """
+    Load the given mounted sub-apps (all of them by default) and return the
+    load time in seconds, or the error message, per mount path.
+    """
+    report = {}
+    for path, sub_app in sub_apps.items():
+        if paths and path not in paths:
+            continue
+        try:
+            sub_app.load()
+            report[path] = round(sub_app.load_seconds, 3)
+        except Exception as e:
+            logger.error(f"Error loading {sub_app.module}: {str(e)}")
+            report[path] = f"error: {str(e)}"
+    return report
+
+
+def print_import_breakdown(sub_apps: dict):
+    print("Sub-app import times:")
+    for path, sub_app in sub_apps.items():
+        if sub_app.loaded:
+            timing = f"{sub_app.load_seconds:8.2f}s"
+        else:
+            timing = "    lazy"
+        print(f"  {path:<16}{timing}  {sub_app.module}")
+    if not all(sub_app.loaded for sub_app in sub_apps.values()):
+        print("  Lazy sub-apps log their import time when first loaded")
@@ -0,0 +1,110 @@
+"""
+Latency of cheap endpoints while heavy NDVI uploads are in flight.
+
+Runs two phases against a live server: cheap requests alone, then cheap
+requests alongside concurrent /ndvi/ndvipredict uploads of synthetic
+series. Reports p50/p99/max of the cheap requests in both phases and the
+executor and event-loop metrics from /admin/executor:
+
+    PYTHONPATH=src uvicorn npk.main:app --port 8000
+    PYTHONPATH=src python -m npk.loadtest --url http://localhost:8000
+"""
+import time
+import argparse
+import threading
+import requests
+from npk.ndvi_fusion import synthetic_series
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def upload_files(seed: int, rows: int) -> dict:
+    # A new seed per upload so the fusion cache cannot answer it
+    vh, vv, ndvi = synthetic_series(rows, seed=seed)
+    return {
+        "vh_file": ("vh.csv", vh.to_csv(index=False), "text/csv"),
+        "vv_file": ("vv.csv", vv.to_csv(index=False), "text/csv"),
+        "ndvi_file": ("ndvi.csv", ndvi.to_csv(index=False), "text/csv"),
+    }
+
+
+def cheap_client(url: str, deadline: float, latencies: list):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        session.get(url, timeout=60)
+        latencies.append(time.perf_counter() - started)
+
+
+def heavy_client(url: str, deadline: float, rows: int, seeds, outcomes: dict, lock: threading.Lock):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        with lock:
+            seed = next(seeds)
+        files = upload_files(seed, rows)
+        try:
+            status = session.post(url, files=files, timeout=600).status_code
+        except requests.RequestException:
+            status = "error"
+        with lock:
+            outcomes[status] = outcomes.get(status, 0) + 1
+
+
+def run_phase(args, heavy: bool) -> list:
+    deadline = time.monotonic() + args.duration
+    latencies = []
+    outcomes = {}
+    lock = threading.Lock()
+    seeds = iter(range(10**9))
+    threads = [
+        threading.Thread(target=cheap_client, args=(args.url + args.cheap_path, deadline, latencies))
+        for _ in range(args.cheap_clients)
+    ]
+    if heavy:
+        threads += [
+            threading.Thread(
+                target=heavy_client,
+                args=(args.url + "/ndvi/ndvipredict", deadline, args.rows, seeds, outcomes, lock)
+            )
+            for _ in range(args.heavy_clients)
+        ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    name = "with uploads" if heavy else "baseline"
+    if latencies:
+        print(
+            f"{name:<13} cheap requests={len(latencies):>6} "
+            f"p50={percentile(latencies, 0.5) * 1000:8.1f}ms "
+            f"p99={percentile(latencies, 0.99) * 1000:8.1f}ms "
+            f"max={max(latencies) * 1000:8.1f}ms"
+        )
+    if heavy:
+        print(f"{'':<13} uploads by status: {outcomes}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="p99 latency of cheap endpoints under concurrent NDVI uploads")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--cheap-path", default="/market/ticker")
+    parser.add_argument("--cheap-clients", type=int, default=8)
+    parser.add_argument("--heavy-clients", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=200000, help="Sentinel-1 rows per upload")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per phase")
+    args = parser.parse_args()
+
+    # Mount the sub-apps first so their import time is not measured
+    requests.post(args.url + "/warmup", timeout=600)
+    run_phase(args, heavy=False)
+    run_phase(args, heavy=True)
+    print(requests.get(args.url + "/admin/executor", timeout=60).json())
+
+
+if __name__ == "__main__":
+    main()
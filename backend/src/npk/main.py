@@ -1,22 +1,34 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import uvicorn
-from npk.Data import Cdata
+from npk.Data import Cdata, SweepRequest
+from npk.tree_engine import load_engine
+from npk.prediction_cache import PredictionCache
+from npk.model_registry import registry
+from npk.soil_index import SoilProfileIndex
+from pathlib import Path
 import numpy as np
 import pickle
+import json
+import math
+import os
+import shutil
+import tempfile
+from typing import Optional
+import time
+import logging
 import pandas as pd
-from npk.ndvi_prediction import app as ndvi_app
-from npk.chatbot.utils import app as chatbot_app
-from npk.price_prediction.app import app as price_app
-from npk.Report.app import app as report_app
-from npk.crop_rotation.app import app as rotation_app
-from npk.image_ndvi.app import app as imageNdvi_app
-from npk.yield_health_prediction.app import app as yield_health_prediction_app
-from npk.Data import Cdata
+from npk.lazy_mount import LazyApp, warmup, print_import_breakdown
+from npk import offload
 
 # Initialize FastAPI app
 app = FastAPI()
 
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -25,30 +37,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount the NDVI prediction app
-app.mount("/ndvi", ndvi_app)
-
-# mount price prediction app
-app.mount("/market", price_app)
+# Sub-apps are imported on their first request, or up front with EAGER_SUBAPPS=1
+sub_apps = {
+    # NDVI prediction app
+    "/ndvi": LazyApp("npk.ndvi_prediction"),
+    # price prediction app
+    "/market": LazyApp("npk.price_prediction.app"),
+    # chatbot app
+    "/chatbot": LazyApp("npk.chatbot.utils"),
+    # Report app
+    "/report": LazyApp("npk.Report.app"),
+    # crop rotation app
+    "/crop-rotation": LazyApp("npk.crop_rotation.app"),
+    # image ndvi app
+    "/image-ndvi": LazyApp("npk.image_ndvi.app"),
+    # yield health prediction app
+    "/prediction": LazyApp("npk.yield_health_prediction.app"),
+}
 
-# chatbot app
-app.mount("/chatbot", chatbot_app)
+for path, sub_app in sub_apps.items():
+    app.mount(path, sub_app)
 
-# Report app
-app.mount("/report", report_app)
+@app.on_event("startup")
+def report_sub_apps():
+    if os.getenv("EAGER_SUBAPPS", "0") == "1":
+        warmup(sub_apps)
+    print_import_breakdown(sub_apps)
+    # Reload artifacts whose files change on disk, e.g. MODEL_WATCH_INTERVAL=10
+    registry.start_watching(float(os.getenv("MODEL_WATCH_INTERVAL", "0")))
+    offload.loop_monitor.start()
 
-# crop rotation app
-app.mount("/crop-rotation", rotation_app)
+MODEL_PATH = os.getenv("CROP_MODEL_PATH", str(Path(__file__).parent / "model.pkl"))
 
-# image ndvi app
-app.mount("/image-ndvi", imageNdvi_app)
+# Quantized-input cache in front of /predict, e.g. CROP_CACHE_PRECISION='{"PH": 0.1, "Rain": 1}'
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("CROP_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("CROP_CACHE_TTL", "3600")),
+    precision=json.loads(os.getenv("CROP_CACHE_PRECISION", "{}")),
+)
 
-# yield health prediction app
-app.mount("/prediction", yield_health_prediction_app)
+def load_crop_model(path):
+    with open(path, "rb") as pickle_in:
+        classifier = pickle.load(pickle_in)
+    # Flattened array engine, or the sklearn classifier itself (CROP_ENGINE=sklearn)
+    return load_engine(classifier)
 
-# Load pre-trained model for crop prediction
-pickle_in = open("src/npk/model.pkl", "rb")
-classifier = pickle.load(pickle_in)
+# Load pre-trained model for crop prediction; cached predictions are dropped on every reload
+registry.register("crop", MODEL_PATH, load_crop_model, on_swap=lambda model: prediction_cache.clear())
 
 # Crop names (map from class index to crop name)
 crops = [
@@ -58,6 +93,167 @@ crops = [
     'coconut', 'cotton', 'jute', 'coffee'
 ]
 
+# Rows scored per classifier call when streaming batch predictions
+BATCH_CHUNK_SIZE = 10000
+
+# Crop_recommendation.csv columns, in the order the classifier expects them
+CSV_FEATURE_COLUMNS = ["N", "P", "K", "ph", "temperature", "humidity", "rainfall"]
+
+# Nearest-neighbour index over the historical soil samples, built once at startup
+DATASET_PATH = str(Path(__file__).parent / "Crop_recommendation.csv")
+soil_index = SoilProfileIndex.from_csv(DATASET_PATH, CSV_FEATURE_COLUMNS)
+
+# Cdata fields in the same column order as to_features
+FEATURE_FIELDS = ["N", "P", "K", "PH", "Temp", "Humidity", "Rain"]
+
+# Upper bound on the number of grid points a single sweep may score
+MAX_SWEEP_POINTS = 2000000
+
+def axis_length(axis) -> int:
+    """
+    Number of grid points on a sweep axis, counting a stop that is a whole
+    number of steps from start despite float error. That error grows with
+    the number of steps and with the magnitude of the bounds.
+    """
+    steps = (axis.stop - axis.start) / axis.step
+    tolerance = 1e-9 * max(1.0, steps) + 4 * math.ulp(max(abs(axis.start), abs(axis.stop))) / axis.step
+    return math.floor(steps + tolerance) + 1
+
+def to_features(records):
+    """
+    Build the (n, 7) feature matrix in the column order the classifier expects.
+    """
+    return np.array([
+        [r.N, r.P, r.K, r.PH, r.Temp, r.Humidity, r.Rain] for r in records
+    ], dtype=float)
+
+async def iter_record_chunks(request: Request, chunk_size: int = BATCH_CHUNK_SIZE):
+    """
+    Yield lists of Cdata parsed from a JSON array or NDJSON request body.
+    NDJSON bodies are parsed line by line as they arrive.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        rows = json.loads(await request.body())
+        if not isinstance(rows, list):
+            raise ValueError("Request body must be a JSON array of records")
+        for start in range(0, len(rows), chunk_size):
+            yield [Cdata(**row) for row in rows[start:start + chunk_size]]
+        return
+
+    records = []
+    pending = b""
+    async for part in request.stream():
+        lines = (pending + part).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                records.append(Cdata(**json.loads(line)))
+        if len(records) >= chunk_size:
+            yield records
+            records = []
+    if pending.strip():
+        records.append(Cdata(**json.loads(pending)))
+    if records:
+        yield records
+
+async def spool_body(request: Request):
+    """
+    Copy the request body into a spooled temporary file. A StreamingResponse
+    cannot read the body once it has started: Starlette is then listening on
+    the same receive channel for the client disconnect.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    async for part in request.stream():
+        spool.write(part)
+    spool.seek(0)
+    return spool
+
+def read_record_chunks(file, content_type: str, chunk_size: int = BATCH_CHUNK_SIZE):
+    """
+    Yield lists of Cdata parsed from a spooled JSON array or NDJSON body,
+    the same way iter_record_chunks parses a live request.
+    """
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        rows = json.load(file)
+        if not isinstance(rows, list):
+            raise ValueError("Request body must be a JSON array of records")
+        for start in range(0, len(rows), chunk_size):
+            yield [Cdata(**row) for row in rows[start:start + chunk_size]]
+        return
+
+    records = []
+    for line in file:
+        if line.strip():
+            records.append(Cdata(**json.loads(line)))
+        if len(records) >= chunk_size:
+            yield records
+            records = []
+    if records:
+        yield records
+
+def score_records(predictor, records):
+    return predictor.predict(to_features(records))
+
+def stream_predictions(file, content_type: str):
+    predictor = registry.get("crop")
+    try:
+        for records in read_record_chunks(file, content_type):
+            predictions = score_records(predictor, records).tolist()
+            yield "".join(json.dumps({'Predicted Crop': p}) + "\n" for p in predictions)
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        yield json.dumps({'error': str(e)}) + "\n"
+    finally:
+        file.close()
+
+def stream_scored_csv(file, chunk_size: int):
+    """
+    Read a soil-test CSV in fixed-size chunks, score each chunk and yield it
+    back as CSV. Per-chunk timings and overall throughput are appended as
+    '#' comment lines once the file is done.
+    """
+    predictor = registry.get("crop")
+    timings = []
+    total_rows = 0
+    try:
+        reader = iter(pd.read_csv(file, chunksize=chunk_size))
+        index = 0
+        while True:
+            # Time parsing and scoring only, not the wait for the client to
+            # read what was yielded
+            chunk_started = time.perf_counter()
+            chunk = next(reader, None)
+            if chunk is None:
+                break
+            missing_cols = set(CSV_FEATURE_COLUMNS) - set(chunk.columns)
+            if missing_cols:
+                raise ValueError(f"Missing columns in CSV file: {sorted(missing_cols)}")
+
+            features = chunk[CSV_FEATURE_COLUMNS].to_numpy(dtype=float)
+            chunk["predicted_crop"] = predictor.predict(features)
+            body = chunk.to_csv(index=False, header=index == 0, lineterminator="\n")
+            timings.append((len(chunk), time.perf_counter() - chunk_started))
+            total_rows += len(chunk)
+            index += 1
+            yield body
+    except Exception as e:
+        logger.error(f"Error scoring CSV: {str(e)}")
+        yield f"# error={str(e)}\n"
+        return
+    finally:
+        file.close()
+
+    total_seconds = sum(elapsed for _, elapsed in timings)
+    for index, (rows, elapsed) in enumerate(timings):
+        yield f"# chunk={index} rows={rows} seconds={elapsed:.6f}\n"
+    rows_per_second = total_rows / total_seconds if total_seconds > 0 else 0.0
+    yield f"# total_rows={total_rows} seconds={total_seconds:.6f} rows_per_second={rows_per_second:.1f}\n"
+    logger.info(
+        f"Scored {total_rows} CSV rows in {len(timings)} chunks "
+        f"({total_seconds:.3f}s, {rows_per_second:.1f} rows/s)"
+    )
+
 @app.get('/')
 def index():
     return {'message': 'FastAPI server'}
@@ -65,20 +261,174 @@ def index():
 @app.post('/predict')
 def predict_crop(data: Cdata):
     try:
-        features = [[
-            data.N,
-            data.P,
-            data.K,
-            data.PH,
-            data.Temp,
-            data.Humidity,
-            data.Rain
-        ]]
-        
-        prediction = classifier.predict(features)
-        return {'Predicted Crop': prediction[0]}
+        key = prediction_cache.key(data)
+        crop = prediction_cache.get(key)
+        if crop is None:
+            generation = prediction_cache.generation
+            predictor = registry.get("crop")
+            features = to_features([data])
+            crop = predictor.predict(features)[0]
+            prediction_cache.put(key, crop, generation)
+        return {'Predicted Crop': crop}
     except Exception as e:
         return {'error': str(e)}
 
+@app.post('/predict/sweep')
+def predict_sweep(sweep: SweepRequest):
+    """
+    Score the Cartesian grid spanned by up to three Cdata fields, holding
+    the other fields at their base values. Returns the axis values, the
+    crop labels and a label-index array shaped like the grid.
+    """
+    fields = [axis.field for axis in sweep.axes]
+    if not 1 <= len(fields) <= 3:
+        raise HTTPException(status_code=400, detail="Between one and three axes are required")
+    if len(set(fields)) != len(fields) or not set(fields) <= set(FEATURE_FIELDS):
+        raise HTTPException(status_code=400, detail=f"Axes must be distinct fields of {FEATURE_FIELDS}")
+    if any(not all(map(math.isfinite, (axis.start, axis.stop, axis.step))) for axis in sweep.axes):
+        raise HTTPException(status_code=400, detail="Axis bounds and steps must be finite")
+    if any(axis.step <= 0 or axis.stop < axis.start for axis in sweep.axes):
+        raise HTTPException(status_code=400, detail="Each axis needs step > 0 and stop >= start")
+
+    # Size the grid with Python ints before allocating anything
+    shape = tuple(axis_length(axis) for axis in sweep.axes)
+    n_points = math.prod(shape)
+    if n_points > MAX_SWEEP_POINTS:
+        raise HTTPException(status_code=400, detail=f"Sweep has {n_points} points, the limit is {MAX_SWEEP_POINTS}")
+    axes = [axis.start + np.arange(length) * axis.step for axis, length in zip(sweep.axes, shape)]
+
+    # Whole grid as one (n_points, 7) matrix, varying fields filled from the meshgrid
+    grid = np.tile(to_features([sweep.base]), (n_points, 1))
+    for field, values in zip(fields, np.meshgrid(*axes, indexing="ij")):
+        grid[:, FEATURE_FIELDS.index(field)] = values.ravel()
+
+    predictor = registry.get("crop")
+    try:
+        predictions = np.concatenate([
+            predictor.predict(grid[start:start + BATCH_CHUNK_SIZE])
+            for start in range(0, n_points, BATCH_CHUNK_SIZE)
+        ])
+    except ValueError as e:
+        # e.g. a NaN base value, which the classifier rejects
+        raise HTTPException(status_code=400, detail=str(e))
+    labels, label_index = np.unique(predictions, return_inverse=True)
+    return {
+        'axes': {field: values.tolist() for field, values in zip(fields, axes)},
+        'labels': labels.tolist(),
+        'grid': label_index.reshape(shape).tolist(),
+    }
+
+@app.post('/predict/neighbors')
+def predict_neighbors(data: Cdata, k: int = Query(5, ge=1, le=100)):
+    """
+    Return the k historical samples closest to the given soil reading.
+    """
+    try:
+        return {'neighbors': soil_index.query(to_features([data]), k)[0]}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post('/predict/neighbors/batch')
+async def predict_neighbors_batch(request: Request, k: int = Query(5, ge=1, le=100)):
+    """
+    Nearest historical samples for a JSON array or NDJSON body of Cdata
+    records, in input order.
+    """
+    try:
+        neighbors = []
+        async for records in iter_record_chunks(request):
+            # KDTree queries are CPU-bound; keep them off the event loop
+            neighbors.extend(await offload.cpu_executor.run(soil_index.query, to_features(records), k))
+        return {'neighbors': neighbors}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post('/warmup')
+def warmup_sub_apps(apps: Optional[str] = Query(None, description="Comma-separated mount paths, all sub-apps if omitted")):
+    paths = apps.split(",") if apps else None
+    return {'load_seconds': warmup(sub_apps, paths)}
+
+@app.get('/predict/cache')
+def prediction_cache_stats():
+    return prediction_cache.stats()
+
+@app.get('/admin/models')
+def model_stats():
+    return registry.stats()
+
+@app.get('/admin/executor')
+def executor_stats():
+    return offload.stats()
+
+@app.post('/admin/models/{name}/reload')
+def reload_model(name: str):
+    try:
+        return registry.reload(name, raise_errors=True)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model {name}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reloading {name}: {str(e)}")
+
+@app.post('/predict/batch')
+async def predict_crop_batch(
+    request: Request,
+    stream: bool = Query(False, description="Stream predictions back as NDJSON while scoring")
+):
+    """
+    Score a JSON array or NDJSON body of Cdata records. Predictions are
+    returned in input order.
+    """
+    if stream:
+        # Read the whole body first; only the scoring is streamed
+        spool = await spool_body(request)
+        return StreamingResponse(
+            stream_predictions(spool, request.headers.get("content-type", "")),
+            media_type="application/x-ndjson"
+        )
+
+    try:
+        predictor = registry.get("crop")
+        records = []
+        async for chunk in iter_record_chunks(request):
+            records.extend(chunk)
+        if not records:
+            return {'Predicted Crops': []}
+
+        # One feature matrix and a single classifier call for the whole batch,
+        # scored on the offload executor so other requests keep being served
+        predictions = await offload.cpu_executor.run(score_records, predictor, records)
+        return {'Predicted Crops': predictions.tolist()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post('/predict/csv')
+def predict_crop_csv(
+    file: UploadFile = File(...),
+    chunk_size: int = Query(BATCH_CHUNK_SIZE, ge=1, le=1000000, description="Rows read and scored per chunk")
+):
+    """
+    Score a soil-test CSV in the Crop_recommendation.csv layout. The scored
+    rows are streamed back with a 'predicted_crop' column; timing stats are
+    reported as trailing '#' comment lines.
+    """
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail=f"{file.filename} must be a CSV file")
+
+    # FastAPI closes the upload when this handler returns, before the body
+    # streams, so hand the generator its own spooled copy
+    spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    shutil.copyfileobj(file.file, spool)
+    spool.seek(0)
+
+    return StreamingResponse(
+        stream_scored_csv(spool, chunk_size),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=scored.csv"}
+    )
+
 if __name__ == '__main__':
     uvicorn.run(app, host='127.0.0.1', port=8000)
\ No newline at end of file
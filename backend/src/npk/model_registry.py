@@ -0,0 +1,144 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def resident_memory() -> Optional[int]:
+    """
+    Current resident set size of this process in bytes (Linux only).
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelEntry:
+    def __init__(self, name: str, path: str, loader: Callable, on_swap: Optional[Callable] = None):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.on_swap = on_swap
+        self.model = None
+        self.version = 0
+        self.mtime = None
+        self.size_bytes = None
+        self.load_seconds = None
+        self.rss_delta_bytes = None
+        self.loaded_at = None
+        self.last_error = None
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "size_bytes": self.size_bytes,
+            "load_seconds": self.load_seconds,
+            "rss_delta_bytes": self.rss_delta_bytes,
+            "last_error": self.last_error,
+        }
+
+
+class ModelRegistry:
+    """
+    Owns loading, versioning and hot-swapping of model artifacts.
+
+    Handlers should call get() once per request and keep the returned
+    object: a reload swaps in a new object, so requests already running
+    finish on the model they started with.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def register(self, name: str, path: str, loader: Callable, on_swap: Optional[Callable] = None):
+        """
+        Register an artifact and load it immediately. loader(path) returns
+        the model object; on_swap(model) runs after every successful load.
+        """
+        self._entries[name] = ModelEntry(name, path, loader, on_swap)
+        self.reload(name, raise_errors=True)
+
+    def get(self, name: str):
+        return self._entries[name].model
+
+    def reload(self, name: str, raise_errors: bool = False) -> dict:
+        entry = self._entries[name]
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(entry.path)
+                size_bytes = os.path.getsize(entry.path)
+                rss_before = resident_memory()
+                started = time.perf_counter()
+                model = entry.loader(entry.path)
+                load_seconds = time.perf_counter() - started
+                rss_after = resident_memory()
+            except Exception as e:
+                logger.error(f"Error loading model {name} from {entry.path}: {str(e)}")
+                entry.last_error = str(e)
+                if raise_errors:
+                    raise
+                return entry.stats()
+
+            # Single reference swap; readers see either the old or the new model
+            entry.model = model
+            entry.version += 1
+            entry.mtime = mtime
+            entry.size_bytes = size_bytes
+            entry.load_seconds = round(load_seconds, 4)
+            entry.rss_delta_bytes = rss_after - rss_before if rss_before is not None else None
+            entry.loaded_at = time.time()
+            entry.last_error = None
+            logger.info(f"Loaded model {name} v{entry.version} in {load_seconds:.2f}s")
+
+            if entry.on_swap is not None:
+                entry.on_swap(model)
+        return entry.stats()
+
+    def reload_changed(self) -> list:
+        """
+        Reload every artifact whose file changed on disk since it was loaded.
+        """
+        reloaded = []
+        for name, entry in list(self._entries.items()):
+            try:
+                mtime = os.path.getmtime(entry.path)
+            except OSError:
+                continue
+            if mtime != entry.mtime:
+                self.reload(name)
+                reloaded.append(name)
+        return reloaded
+
+    def start_watching(self, interval: float):
+        """
+        Poll artifact mtimes every interval seconds on a daemon thread.
+        """
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                self.reload_changed()
+
+        self._watcher = threading.Thread(target=watch, name="model-registry-watch", daemon=True)
+        self._watcher.start()
+
+    def stats(self) -> dict:
+        return {
+            "rss_bytes": resident_memory(),
+            "models": {name: entry.stats() for name, entry in self._entries.items()},
+        }
+
+
+# Shared by the main app and every sub-app in this process
+registry = ModelRegistry()
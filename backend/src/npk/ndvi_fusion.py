@@ -0,0 +1,290 @@
+"""
+Vectorized Sentinel-1 / NDVI fusion.
+
+Produces the same frame as ndvi_prediction.create_data without per-element
+Timestamp conversions: dates stay int64 epoch nanoseconds, interpolation is
+interp1d's linear scheme done with array indexing and both nearest-date joins
+are np.searchsorted. Parity check, timings from 100 to 1M rows and a threshold
+sweep timing:
+
+    PYTHONPATH=src python -m npk.ndvi_fusion
+"""
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DAY_NS = 86400 * 10**9
+
+
+def to_epoch_ns(dates) -> np.ndarray:
+    """
+    Parse a column of dates into int64 nanoseconds since the epoch.
+    """
+    return pd.to_datetime(dates).to_numpy(dtype="datetime64[ns]").view("int64")
+
+
+def nearest_index(sorted_keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Index of the nearest key for every value, with ties going to the
+    earlier key, as pd.merge_asof(direction="nearest") resolves them.
+    """
+    backward = np.searchsorted(sorted_keys, values, side="right") - 1
+    forward = np.searchsorted(sorted_keys, values, side="left")
+    has_backward = backward >= 0
+    has_forward = forward < len(sorted_keys)
+    backward_distance = values - sorted_keys[np.clip(backward, 0, None)]
+    forward_distance = sorted_keys[np.clip(forward, None, len(sorted_keys) - 1)] - values
+    use_forward = has_forward & (~has_backward | (forward_distance < backward_distance))
+    return np.where(use_forward, forward, backward)
+
+
+class PreparedSeries:
+    """
+    The cloud-threshold independent part of a fusion: merged Sentinel-1
+    rows and NDVI observations as date-sorted arrays, plus the cloud
+    coverage of each Sentinel-1 row's nearest NDVI observation. sar_ndvi
+    holds per-row corr_model predictions once a caller has filled it in.
+    """
+
+    def __init__(self, sent1_dates, vh, vv, ndvi_dates, ndvi_mean, cloud_coverage):
+        self.sent1_dates = sent1_dates
+        self.vh = vh
+        self.vv = vv
+        self.ndvi_dates = ndvi_dates
+        self.ndvi_mean = ndvi_mean
+        self.cloud_coverage = cloud_coverage
+        if len(ndvi_dates):
+            self.row_clouds = cloud_coverage[nearest_index(ndvi_dates, sent1_dates)]
+        else:
+            self.row_clouds = cloud_coverage[:0]
+        self.sar_ndvi = None
+
+    def sar_features(self) -> pd.DataFrame:
+        # Same frame layout corr_model is called with in handle_cloud_coverage_and_predict
+        return pd.DataFrame({"VH": self.vh, "VV": self.vv})
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.sent1_dates, self.vh, self.vv, self.ndvi_dates,
+                  self.ndvi_mean, self.cloud_coverage, self.row_clouds, self.sar_ndvi]
+        return sum(np.asarray(array).nbytes for array in arrays if array is not None)
+
+
+def prepare_series(vh_data: pd.DataFrame, vv_data: pd.DataFrame, ndvi_data: pd.DataFrame) -> PreparedSeries:
+    """
+    Merge and sort the three uploads into a PreparedSeries.
+    """
+    # Merge Sentinel-1 data
+    sent1_data = pd.merge(vh_data, vv_data, on="date", how="inner",
+                          suffixes=('_vh', '_vv'))
+    sent1_dates = to_epoch_ns(sent1_data["date"])
+    order = np.argsort(sent1_dates, kind="stable")
+
+    ndvi_dates = to_epoch_ns(ndvi_data["date"])
+    ndvi_order = np.argsort(ndvi_dates, kind="stable")
+    return PreparedSeries(
+        sent1_dates[order],
+        sent1_data["mean_vh"].to_numpy()[order],
+        sent1_data["mean_vv"].to_numpy()[order],
+        ndvi_dates[ndvi_order],
+        ndvi_data["mean"].to_numpy(dtype=float)[ndvi_order],
+        ndvi_data["cloudCoveragePercent"].to_numpy()[ndvi_order],
+    )
+
+
+def linear_interp1d(x: np.ndarray, y: np.ndarray, x_new: np.ndarray) -> np.ndarray:
+    """
+    interp1d(x, y, kind="linear", fill_value="extrapolate")(x_new) for sorted
+    x, with the same segment choice and arithmetic. Unlike np.interp, a date
+    shared by several observations takes the first of them at that date, and
+    a single observation gives NaN, as create_data does.
+    """
+    hi = np.clip(np.searchsorted(x, x_new, side="left"), 1, len(x) - 1)
+    lo = hi - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (y[hi] - y[lo]) / (x[hi] - x[lo])
+    return slope * (x_new - x[lo]) + y[lo]
+
+
+def interpolate_clear(prepared: PreparedSeries, clear: np.ndarray, dates: np.ndarray) -> np.ndarray:
+    """
+    NDVI at dates (epoch ns), interpolated from the observations selected by
+    clear. Dates are first snapped to the nearest day of the clear span, as
+    create_data does with its daily date_range.
+    """
+    clear_dates = prepared.ndvi_dates[clear]
+    clear_mean = prepared.ndvi_mean[clear]
+
+    start = clear_dates[0]
+    n_days = (clear_dates[-1] - start) // DAY_NS + 1
+    grid_days = start + np.arange(n_days) * DAY_NS
+    grid_dates = grid_days[nearest_index(grid_days, dates)]
+
+    # Seconds as float, the same abscissa interp1d saw in create_data
+    return linear_interp1d(clear_dates / 1e9, clear_mean, grid_dates / 1e9)
+
+
+def fuse_prepared(prepared: PreparedSeries, cloud_threshold: float) -> pd.DataFrame:
+    """
+    The threshold-dependent part of a fusion: interpolate the clear NDVI
+    observations onto the Sentinel-1 rows.
+    """
+    # Clear observations drive the interpolation
+    clear = prepared.cloud_coverage <= cloud_threshold
+    if not clear.any():
+        raise ValueError(f"No NDVI data remaining after applying cloud threshold of {cloud_threshold}%")
+    if len(prepared.sent1_dates) == 0:
+        raise ValueError("No data remaining after merging datasets")
+    ndvi = interpolate_clear(prepared, clear, prepared.sent1_dates)
+
+    return pd.DataFrame({
+        "date": pd.to_datetime(prepared.sent1_dates),
+        "VH": prepared.vh,
+        "VV": prepared.vv,
+        "ndvi": ndvi,
+        "cloudCoveragePercent": prepared.row_clouds,
+    })
+
+
+def sweep_thresholds(prepared: PreparedSeries, thresholds, holdout_every: int = 5) -> list:
+    """
+    Evaluate several cloud thresholds against one PreparedSeries, whose
+    sar_ndvi must be filled in. Per threshold this returns the summary
+    counts of /ndvipredict and the gap-filling error at held-out clear
+    observations: every holdout_every-th interior clear observation is left
+    out of the interpolation, and the value the pipeline would then produce
+    at its nearest Sentinel-1 row is compared with the observed NDVI.
+    """
+    n_rows = len(prepared.sent1_dates)
+    results = []
+    for threshold in thresholds:
+        entry = {"cloud_threshold": threshold}
+        results.append(entry)
+        clear = prepared.cloud_coverage <= threshold
+        if not clear.any():
+            entry["error"] = f"No NDVI data remaining after applying cloud threshold of {threshold}%"
+            continue
+        if n_rows == 0:
+            entry["error"] = "No data remaining after merging datasets"
+            continue
+
+        cloudy_rows = prepared.row_clouds > threshold
+        entry["summary"] = {
+            "total_predictions": n_rows,
+            "cloudy_predictions": int(cloudy_rows.sum()),
+            "clear_predictions": int((~cloudy_rows).sum()),
+        }
+
+        # Keep both ends so the interpolated span is unchanged
+        held_out = np.flatnonzero(clear)[1:-1][holdout_every - 1::holdout_every]
+        if len(held_out) == 0:
+            entry["holdout"] = {"count": 0, "mae": None, "rmse": None}
+            continue
+        training = clear.copy()
+        training[held_out] = False
+        rows = nearest_index(prepared.sent1_dates, prepared.ndvi_dates[held_out])
+        interpolated = interpolate_clear(prepared, training, prepared.sent1_dates[rows])
+        filled = np.where(cloudy_rows[rows], prepared.sar_ndvi[rows], interpolated)
+        errors = filled - prepared.ndvi_mean[held_out]
+        # Rows without a SAR prediction (missing VH/VV) cannot be scored
+        errors = errors[np.isfinite(errors)]
+        entry["holdout"] = {
+            "count": int(len(errors)),
+            "mae": float(np.mean(np.abs(errors))) if len(errors) else None,
+            "rmse": float(np.sqrt(np.mean(errors ** 2))) if len(errors) else None,
+        }
+    return results
+
+
+def fuse_sentinel_ndvi(
+    vh_data: pd.DataFrame,
+    vv_data: pd.DataFrame,
+    ndvi_data: pd.DataFrame,
+    cloud_threshold: float
+) -> pd.DataFrame:
+    """
+    Array-based equivalent of ndvi_prediction.create_data.
+
+    Dates are handled as int64 epoch nanoseconds. Each Sentinel-1 date is
+    snapped to the nearest day of the clear-sky NDVI span, the NDVI is
+    linearly interpolated there, and the cloud coverage comes from the
+    nearest original NDVI observation found with searchsorted.
+
+    Observations sharing a date are kept in upload order. create_data sorts
+    them with pandas' default (unstable) sort, so on long series with
+    duplicated dates it may pick a different one of them.
+    """
+    try:
+        return fuse_prepared(prepare_series(vh_data, vv_data, ndvi_data), cloud_threshold)
+    except Exception as e:
+        logger.error(f"Error in fuse_sentinel_ndvi: {str(e)}")
+        raise
+
+
+def fuse_field(field_id, vh_data, vv_data, ndvi_data, cloud_threshold: float):
+    """
+    Process-pool task for batch requests: fuse one field's series.
+    Returns (field_id, frame, error), with exactly one of frame/error set.
+    """
+    try:
+        return field_id, fuse_sentinel_ndvi(vh_data, vv_data, ndvi_data, cloud_threshold), None
+    except Exception as e:
+        return field_id, None, str(e)
+
+
+def synthetic_series(n_rows: int, seed: int = 0):
+    """
+    Hourly Sentinel-1 VH/VV rows and a 5-daily NDVI series over the same span.
+    """
+    rng = np.random.default_rng(seed)
+    sent1_dates = pd.date_range("1990-01-01", periods=n_rows, freq="h").strftime("%Y-%m-%d %H:%M:%S")
+    ndvi_dates = pd.date_range("1990-01-01", periods=max(n_rows // 120, 2), freq="5D").strftime("%Y-%m-%d")
+    vh = pd.DataFrame({"date": sent1_dates, "mean": rng.normal(-18, 2, n_rows)})
+    vv = pd.DataFrame({"date": sent1_dates, "mean": rng.normal(-11, 2, n_rows)})
+    ndvi = pd.DataFrame({
+        "date": ndvi_dates,
+        "mean": rng.uniform(0.1, 0.9, len(ndvi_dates)),
+        "cloudCoveragePercent": rng.uniform(0, 100, len(ndvi_dates)),
+    })
+    return vh, vv, ndvi
+
+
+def check_parity(vh, vv, ndvi, cloud_threshold: float, create_data) -> bool:
+    """
+    True when fuse_sentinel_ndvi reproduces create_data on these inputs.
+    """
+    expected = create_data(vh.copy(), vv.copy(), ndvi.copy(), cloud_threshold).reset_index(drop=True)
+    actual = fuse_sentinel_ndvi(vh, vv, ndvi, cloud_threshold)
+    try:
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-9)
+        return True
+    except AssertionError as e:
+        logger.error(f"Fusion parity mismatch: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    from npk.ndvi_prediction import create_data
+
+    for n_rows in [100, 1000, 10000, 100000, 1000000]:
+        vh, vv, ndvi = synthetic_series(n_rows)
+        started = time.perf_counter()
+        create_data(vh.copy(), vv.copy(), ndvi.copy(), 20.0)
+        reference = time.perf_counter() - started
+        started = time.perf_counter()
+        fuse_sentinel_ndvi(vh, vv, ndvi, 20.0)
+        fused = time.perf_counter() - started
+        parity = check_parity(vh, vv, ndvi, 20.0, create_data) if n_rows <= 100000 else "skipped"
+        print(f"rows={n_rows:>8} create_data={reference:8.3f}s fused={fused:8.3f}s parity={parity}")
+
+    # Threshold sweep: 20 thresholds against one prepared series
+    vh, vv, ndvi = synthetic_series(100000)
+    prepared = prepare_series(vh, vv, ndvi)
+    prepared.sar_ndvi = np.zeros(len(prepared.sent1_dates))
+    for thresholds in [[20.0], list(np.linspace(5, 100, 20))]:
+        started = time.perf_counter()
+        sweep_thresholds(prepared, thresholds)
+        print(f"sweep thresholds={len(thresholds):>3} {time.perf_counter() - started:8.3f}s")
@@ -1,10 +1,23 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+import numpy as np
 import pandas as pd
 import pickle
 import logging
+import os
+import io
+import json
+import asyncio
+import zipfile
+import multiprocessing
+from pathlib import Path, PurePosixPath
+from concurrent.futures import ProcessPoolExecutor
 from scipy.interpolate import interp1d
-from typing import Dict, List
+from typing import Dict, List, Optional
+from npk.model_registry import registry
+from npk.ndvi_fusion import fuse_field, prepare_series, fuse_prepared, sweep_thresholds, PreparedSeries
+from npk.fusion_cache import FusionCache, upload_digest
+from npk.offload import cpu_executor
 
 # Initialize FastAPI app
 app = FastAPI(title="NDVI Prediction API")
@@ -13,84 +26,362 @@ app = FastAPI(title="NDVI Prediction API")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load pre-trained model
+MODEL_PATH = os.getenv("CORR_MODEL_PATH", str(Path(__file__).parent / "corr_model.pkl"))
+
+def load_corr_model(path):
+    with open(path, "rb") as model_file:
+        return pickle.load(model_file)
+
+# Parsed uploads and their SAR predictions, keyed by content hash, so a new
+# cloud_threshold only re-runs interpolation and selection
+fusion_cache = FusionCache(maxbytes=int(os.getenv("NDVI_CACHE_BYTES", 256 * 1024 * 1024)))
+
+# Load pre-trained model; cached SAR predictions are dropped on every reload
 try:
-    with open("src/npk/corr_model.pkl", "rb") as model_file:
-        classifier = pickle.load(model_file)
+    registry.register("corr_model", MODEL_PATH, load_corr_model, on_swap=lambda model: fusion_cache.clear())
 except FileNotFoundError as e:
     logger.error(f"Required file not found: {e}")
     raise Exception(f"Required file not found: {e}")
 
+REQUIRED_COLUMNS = {
+    "vh": ["date", "mean"],
+    "vv": ["date", "mean"],
+    "ndvi": ["date", "mean", "cloudCoveragePercent"]
+}
+
+MAX_SWEEP_THRESHOLDS = 100
+
+# Worker processes fusing fields for /ndvipredict/batch, started on first use
+BATCH_WORKERS = int(os.getenv("NDVI_BATCH_WORKERS", os.cpu_count() or 1))
+batch_pool = None
+
+def get_batch_pool() -> ProcessPoolExecutor:
+    global batch_pool
+    if batch_pool is None:
+        # spawn: never fork a serving process that may be running threads
+        batch_pool = ProcessPoolExecutor(
+            max_workers=BATCH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return batch_pool
+
+def validate_columns(frames: Dict[str, pd.DataFrame], extra: tuple = ()):
+    """
+    Raise a 400 naming the first vh/vv/ndvi frame that lacks a required column.
+    """
+    for name, df in frames.items():
+        missing_cols = (set(REQUIRED_COLUMNS[name]) | set(extra)) - set(df.columns)
+        if missing_cols:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Missing columns in {name} file: {list(missing_cols)}"
+            )
+
+def prediction_payload(predictions: pd.DataFrame, cloud_threshold: float) -> dict:
+    """
+    Records and summary counts for one field's predictions.
+    """
+    predictions = predictions.copy()
+    # Convert 'date' column to string format
+    predictions["date"] = predictions["date"].dt.strftime("%Y-%m-%d")
+    cloudy = predictions['cloudCoveragePercent'] > cloud_threshold
+    # Missing readings become null; NaN is not valid JSON
+    records = predictions.astype(object).where(predictions.notna(), None)
+    return {
+        "predictions": records.to_dict(orient="records"),
+        "summary": {
+            "total_predictions": len(predictions),
+            "cloudy_predictions": int(cloudy.sum()),
+            "clear_predictions": int((~cloudy).sum())
+        }
+    }
+
 @app.get("/")
 async def index():
     return {"message": "Welcome to the NDVI Prediction API"}
 
 @app.post("/ndvipredict")
 async def predict(
-    vh_file: UploadFile = File(...),
-    vv_file: UploadFile = File(...),
-    ndvi_file: UploadFile = File(...),
-    cloud_threshold: float = Query(20.0, ge=0.0, le=100.0, description="Maximum allowable cloud coverage percentage")
+    vh_file: Optional[UploadFile] = File(None),
+    vv_file: Optional[UploadFile] = File(None),
+    ndvi_file: Optional[UploadFile] = File(None),
+    cloud_threshold: float = Query(20.0, ge=0.0, le=100.0, description="Maximum allowable cloud coverage percentage"),
+    upload_id: Optional[str] = Query(None, description="upload_id of an earlier request, instead of re-sending the files")
 ):
     """
     Endpoint to predict NDVI values based on VH and VV data.
     """
     try:
-        # Validate file types
-        for file in [vh_file, vv_file, ndvi_file]:
-            if not file.filename.endswith('.csv'):
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"{file.filename} must be a CSV file"
-                )
+        upload_id, prepared = await resolve_upload(vh_file, vv_file, ndvi_file, upload_id)
+        return await cpu_executor.run(render_predictions, upload_id, prepared, cloud_threshold)
 
-        # Read CSV files
-        df_vh = pd.read_csv(vh_file.file)
-        df_vv = pd.read_csv(vv_file.file)
-        df_ndvi = pd.read_csv(ndvi_file.file)
-
-        # Validate required columns
-        required_columns = {
-            "vh": ["date", "mean"],
-            "vv": ["date", "mean"],
-            "ndvi": ["date", "mean", "cloudCoveragePercent"]
-        }
-        
-        for name, df, cols in zip(
-            ["vh", "vv", "ndvi"],
-            [df_vh, df_vv, df_ndvi],
-            required_columns.values()
-        ):
-            missing_cols = set(cols) - set(df.columns)
-            if missing_cols:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Missing columns in {name} file: {list(missing_cols)}"
-                )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error during prediction: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Process the data
-        processed_data = create_data(df_vh, df_vv, df_ndvi, cloud_threshold)
-        
-        # Make predictions
-        predictions = handle_cloud_coverage_and_predict(processed_data, cloud_threshold)
+@app.post("/ndvipredict/sweep")
+async def sweep(
+    thresholds: List[float] = Query(..., description="Cloud thresholds to evaluate, e.g. ?thresholds=10&thresholds=20"),
+    holdout_every: int = Query(5, ge=2, le=100, description="Hold out every n-th clear observation to score the gap filling"),
+    vh_file: Optional[UploadFile] = File(None),
+    vv_file: Optional[UploadFile] = File(None),
+    ndvi_file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Query(None, description="upload_id of an earlier request, instead of re-sending the files")
+):
+    """
+    Evaluate several cloud thresholds in one pass. SAR predictions are made
+    once per upload; each threshold only changes the interpolation mask.
+    """
+    try:
+        if not 0 < len(thresholds) <= MAX_SWEEP_THRESHOLDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Send between 1 and {MAX_SWEEP_THRESHOLDS} thresholds"
+            )
+        if any(not 0.0 <= threshold <= 100.0 for threshold in thresholds):
+            raise HTTPException(status_code=400, detail="Thresholds must be between 0 and 100")
 
-        # Convert 'date' column to string format
-        predictions["date"] = predictions["date"].dt.strftime("%Y-%m-%d")
+        upload_id, prepared = await resolve_upload(vh_file, vv_file, ndvi_file, upload_id)
+        results = await cpu_executor.run(sweep_thresholds, prepared, thresholds, holdout_every)
 
         return JSONResponse(content={
-            "message": "Prediction successful",
-            "predictions": predictions.to_dict(orient="records"),
-            "summary": {
-                "total_predictions": len(predictions),
-                "cloudy_predictions": sum(predictions['cloudCoveragePercent'] > cloud_threshold),
-                "clear_predictions": sum(predictions['cloudCoveragePercent'] <= cloud_threshold)
-            }
+            "message": "Sweep successful",
+            "upload_id": upload_id,
+            "holdout_every": holdout_every,
+            "thresholds": results
         })
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error during prediction: {str(e)}")
+        logger.error(f"Error during threshold sweep: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/ndvipredict/cache")
+async def fusion_cache_stats():
+    return fusion_cache.stats()
+
+async def resolve_upload(vh_file, vv_file, ndvi_file, upload_id: Optional[str]):
+    """
+    (upload_id, PreparedSeries) for a request that either uploads the three
+    CSVs or names an earlier upload by its upload_id.
+    """
+    if upload_id is not None:
+        prepared = fusion_cache.get(upload_id)
+        if prepared is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Upload {upload_id} is no longer cached, send the files again"
+            )
+        return upload_id, prepared
+
+    files = [vh_file, vv_file, ndvi_file]
+    if any(file is None for file in files):
+        raise HTTPException(
+            status_code=400,
+            detail="Send vh_file, vv_file and ndvi_file, or the upload_id of an earlier request"
+        )
+    # Validate file types
+    for file in files:
+        if not file.filename.endswith('.csv'):
+            raise HTTPException(
+                status_code=400, 
+                detail=f"{file.filename} must be a CSV file"
+            )
+    contents = [await file.read() for file in files]
+    upload_id = await cpu_executor.run(upload_digest, contents)
+    prepared = fusion_cache.get(upload_id)
+    if prepared is None:
+        prepared = await cpu_executor.run(prepare_upload, upload_id, contents)
+    return upload_id, prepared
+
+def render_predictions(upload_id: str, prepared: PreparedSeries, cloud_threshold: float) -> JSONResponse:
+    """
+    Interpolate for this threshold, pick actual or SAR-predicted NDVI per row
+    and encode the response. Runs on the offload executor.
+    """
+    processed_data = fuse_prepared(prepared, cloud_threshold)
+    predictions = apply_sar_predictions(processed_data, prepared.sar_ndvi, cloud_threshold)
+
+    return JSONResponse(content={
+        "message": "Prediction successful",
+        "upload_id": upload_id,
+        **prediction_payload(predictions, cloud_threshold)
+    })
+
+def prepare_upload(upload_id: str, contents: List[bytes]) -> PreparedSeries:
+    """
+    Parse the vh/vv/ndvi CSV bytes, merge them and run corr_model on every
+    Sentinel-1 row, caching the result under the upload's content hash.
+    """
+    generation = fusion_cache.generation
+    frames = {
+        name: pd.read_csv(io.BytesIO(content))
+        for name, content in zip(["vh", "vv", "ndvi"], contents)
+    }
+
+    # Validate required columns
+    validate_columns(frames)
+
+    prepared = prepare_series(frames["vh"], frames["vv"], frames["ndvi"])
+    # SAR predictions do not depend on the threshold, so score every row once.
+    # Rows with missing VH/VV stay NaN: they only matter if they turn out cloudy
+    features = prepared.sar_features()
+    scorable = np.isfinite(features.to_numpy(dtype=float)).all(axis=1)
+    prepared.sar_ndvi = np.full(len(features), np.nan)
+    if scorable.any():
+        prepared.sar_ndvi[scorable] = registry.get("corr_model").predict(features[scorable])
+    fusion_cache.put(upload_id, prepared, generation)
+    return prepared
+
+def split_long_format(frames: Dict[str, pd.DataFrame]) -> Dict[str, tuple]:
+    """
+    Split long-format vh/vv/ndvi frames on their field_id column into
+    {field_id: (vh, vv, ndvi)}. A field missing from one of the files gets
+    an empty frame there and fails on its own.
+    """
+    groups = {
+        name: {str(field_id): group.drop(columns="field_id") for field_id, group in df.groupby("field_id", sort=False)}
+        for name, df in frames.items()
+    }
+    fields = {}
+    for name in ["vh", "vv", "ndvi"]:
+        for field_id in groups[name]:
+            fields.setdefault(field_id, tuple(
+                groups[kind].get(field_id, pd.DataFrame(columns=REQUIRED_COLUMNS[kind]))
+                for kind in ["vh", "vv", "ndvi"]
+            ))
+    return fields
+
+def read_long_format(files: Dict[str, UploadFile]) -> Dict[str, tuple]:
+    frames = {name: pd.read_csv(file.file) for name, file in files.items()}
+    validate_columns(frames, extra=("field_id",))
+    return split_long_format(frames)
+
+def read_field_archive(file) -> Dict[str, tuple]:
+    """
+    Read a zip of per-field triplets into {field_id: (vh, vv, ndvi)}.
+    Members are either <field_id>/vh.csv or <field_id>_vh.csv (same for vv
+    and ndvi); anything else in the archive is ignored.
+    """
+    kinds = ["vh", "vv", "ndvi"]
+    triplets = {}
+    with zipfile.ZipFile(file) as archive:
+        for member in archive.namelist():
+            path = PurePosixPath(member)
+            if path.suffix.lower() != ".csv" or path.name.startswith("."):
+                continue
+            stem = path.stem.lower()
+            if stem in kinds:
+                field_id, kind = path.parent.name, stem
+            elif "_" in path.stem and path.stem.rsplit("_", 1)[1].lower() in kinds:
+                field_id, kind = path.stem.rsplit("_", 1)[0], path.stem.rsplit("_", 1)[1].lower()
+            else:
+                continue
+            with archive.open(member) as csv_file:
+                triplets.setdefault(field_id, {})[kind] = pd.read_csv(csv_file)
+
+    fields = {}
+    for field_id, frames in triplets.items():
+        missing = [kind for kind in kinds if kind not in frames]
+        if missing:
+            raise ValueError(f"Field {field_id} is missing {missing} in the archive")
+        validate_columns(frames)
+        fields[field_id] = tuple(frames[kind] for kind in kinds)
+    return fields
+
+async def stream_field_predictions(fields: Dict[str, tuple], cloud_threshold: float):
+    """
+    Fuse every field on the process pool, then score the cloudy rows of all
+    fused fields with a single corr_model call and yield one NDJSON line per
+    field. Fields that fail to fuse are reported as soon as they do.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_batch_pool()
+    pending = {
+        loop.run_in_executor(pool, fuse_field, field_id, vh, vv, ndvi, cloud_threshold): field_id
+        for field_id, (vh, vv, ndvi) in fields.items()
+    }
+    fused = {}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                field_id = pending.pop(future)
+                try:
+                    _, frame, error = future.result()
+                except Exception as e:
+                    frame, error = None, str(e)
+                if error is not None:
+                    yield json.dumps({"field_id": field_id, "error": error}) + "\n"
+                else:
+                    fused[field_id] = frame
+    finally:
+        # Client went away: drop fields that have not started yet
+        for future in pending:
+            future.cancel()
+
+    if not fused:
+        return
+    try:
+        results = await cpu_executor.run(handle_cloud_coverage_and_predict_many, fused, cloud_threshold)
+    except Exception as e:
+        for field_id in fused:
+            yield json.dumps({"field_id": field_id, "error": str(e)}) + "\n"
+        return
+    for field_id, predictions in results.items():
+        yield await cpu_executor.run(render_field_line, field_id, predictions, cloud_threshold)
+
+def render_field_line(field_id: str, predictions: pd.DataFrame, cloud_threshold: float) -> str:
+    return json.dumps({"field_id": field_id, **prediction_payload(predictions, cloud_threshold)}) + "\n"
+
+@app.post("/ndvipredict/batch")
+async def predict_batch(
+    vh_file: Optional[UploadFile] = File(None),
+    vv_file: Optional[UploadFile] = File(None),
+    ndvi_file: Optional[UploadFile] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    cloud_threshold: float = Query(20.0, ge=0.0, le=100.0, description="Maximum allowable cloud coverage percentage")
+):
+    """
+    Predict NDVI for many fields in one request, streamed back as NDJSON
+    with one line per field. Send either long-format vh/vv/ndvi CSVs with a
+    field_id column, or a zip archive of per-field CSV triplets.
+    """
+    try:
+        if archive is not None:
+            if not archive.filename.endswith('.zip'):
+                raise HTTPException(status_code=400, detail=f"{archive.filename} must be a ZIP archive")
+            fields = await cpu_executor.run(read_field_archive, archive.file)
+        else:
+            files = {"vh": vh_file, "vv": vv_file, "ndvi": ndvi_file}
+            missing = [name for name, file in files.items() if file is None]
+            if missing:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Send an archive or all of vh_file, vv_file and ndvi_file (missing {missing})"
+                )
+            for file in files.values():
+                if not file.filename.endswith('.csv'):
+                    raise HTTPException(status_code=400, detail=f"{file.filename} must be a CSV file")
+            fields = await cpu_executor.run(read_long_format, files)
+
+        if not fields:
+            raise ValueError("No fields found in the upload")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error reading batch upload: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+    return StreamingResponse(
+        stream_field_predictions(fields, cloud_threshold),
+        media_type="application/x-ndjson"
+    )
+
 def create_data(
     vh_data: pd.DataFrame,
     vv_data: pd.DataFrame,
@@ -99,6 +390,7 @@ def create_data(
 ) -> pd.DataFrame:
     """
     Process and merge VH, VV, and NDVI data using scipy interpolation.
+    Reference implementation for npk.ndvi_fusion.fuse_sentinel_ndvi.
     """
     try:
         # Merge Sentinel-1 data
@@ -187,6 +479,7 @@ def handle_cloud_coverage_and_predict(data: pd.DataFrame, cloud_threshold: float
         
         # Predict NDVI for rows exceeding cloud threshold
         if cloud_exceed_rows.any():
+            classifier = registry.get("corr_model")
             result.loc[cloud_exceed_rows, 'predicted_ndvi'] = classifier.predict(
                 result.loc[cloud_exceed_rows, ['VH', 'VV']]
             )
@@ -202,4 +495,45 @@ def handle_cloud_coverage_and_predict(data: pd.DataFrame, cloud_threshold: float
         
     except Exception as e:
         logger.error(f"Error in handle_cloud_coverage_and_predict: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def handle_cloud_coverage_and_predict_many(
+    frames: Dict[str, pd.DataFrame],
+    cloud_threshold: float
+) -> Dict[str, pd.DataFrame]:
+    """
+    handle_cloud_coverage_and_predict for several fields at once, with a
+    single corr_model call over the cloudy rows of all of them.
+    """
+    try:
+        masks = {field_id: frame['cloudCoveragePercent'] > cloud_threshold for field_id, frame in frames.items()}
+        cloudy = pd.concat([frame.loc[masks[field_id], ['VH', 'VV']] for field_id, frame in frames.items()])
+        predicted = registry.get("corr_model").predict(cloudy) if len(cloudy) else np.empty(0)
+
+        results = {}
+        offset = 0
+        for field_id, frame in frames.items():
+            mask = masks[field_id]
+            count = int(mask.sum())
+            result = frame.copy()
+            result['predicted_ndvi'] = result['ndvi'].astype(float)
+            result.loc[mask, 'predicted_ndvi'] = predicted[offset:offset + count]
+            offset += count
+            result['prediction_type'] = np.where(mask, 'predicted', 'actual')
+            results[field_id] = result
+        return results
+
+    except Exception as e:
+        logger.error(f"Error in handle_cloud_coverage_and_predict_many: {str(e)}")
+        raise
+
+def apply_sar_predictions(data: pd.DataFrame, sar_ndvi, cloud_threshold: float) -> pd.DataFrame:
+    """
+    handle_cloud_coverage_and_predict with the corr_model output for every
+    row of data already computed.
+    """
+    result = data.copy()
+    cloud_exceed_rows = result['cloudCoveragePercent'] > cloud_threshold
+    result['predicted_ndvi'] = np.where(cloud_exceed_rows, sar_ndvi, result['ndvi'])
+    result['prediction_type'] = np.where(cloud_exceed_rows, 'predicted', 'actual')
+    return result
@@ -0,0 +1,137 @@
+"""
+Bounded executor for CPU-bound request work, plus event-loop lag metrics.
+
+Async handlers hand pandas, sklearn and torch work to cpu_executor.run() so
+the event loop keeps serving cheap requests while a large upload is being
+processed. The pool has OFFLOAD_WORKERS threads and admits at most
+OFFLOAD_QUEUE_SIZE waiting jobs; past that, requests get a 503 with
+Retry-After instead of piling up. Both are exported at /admin/executor.
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up from a fixed sleep. Lag well
+    above zero means something is blocking the loop.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 600):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task = None
+        self._loop = None
+
+    def start(self):
+        """
+        Start sampling on the running loop. Called from the app's startup
+        hook; a task left behind by a closed loop (a test client, a reload,
+        a forked worker) is replaced and the old samples dropped.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self.samples.clear()
+        self.max_lag = 0.0
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> dict:
+        samples = sorted(self.samples)
+        if not samples:
+            return {"samples": 0, "last_seconds": None, "p50_seconds": None, "p99_seconds": None, "max_seconds": None}
+        return {
+            "samples": len(samples),
+            "last_seconds": self.samples[-1],
+            "p50_seconds": samples[len(samples) // 2],
+            "p99_seconds": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            "max_seconds": self.max_lag,
+        }
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded backlog. run() awaits fn(*args) on a worker
+    thread, or raises a 503 when workers + queue_size jobs are already in.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="offload")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queued = 0
+        self.busy_seconds = 0.0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
+            self.pending += 1
+            self.max_queued = max(self.max_queued, self.pending - self.running)
+        future = self._pool.submit(self._call, fn, args)
+        # Runs on completion and on cancellation, so pending never leaks
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def _call(self, fn, args):
+        with self._lock:
+            self.running += 1
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.busy_seconds += time.perf_counter() - started
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "busy_seconds": round(self.busy_seconds, 3),
+            }
+
+
+loop_monitor = LoopLagMonitor(interval=float(os.getenv("LOOP_LAG_INTERVAL", "0.1")))
+
+cpu_executor = BoundedExecutor(
+    workers=int(os.getenv("OFFLOAD_WORKERS", os.cpu_count() or 1)),
+    queue_size=int(os.getenv("OFFLOAD_QUEUE_SIZE", "32")),
+)
+
+
+def stats() -> dict:
+    return {"executor": cpu_executor.stats(), "event_loop": loop_monitor.stats()}
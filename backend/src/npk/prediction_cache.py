@@ -0,0 +1,81 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Quantization step per Cdata field; readings closer than a step share a cache entry
+DEFAULT_PRECISION = {
+    "N": 1.0,
+    "P": 1.0,
+    "K": 1.0,
+    "Temp": 0.1,
+    "Humidity": 0.1,
+    "PH": 0.1,
+    "Rain": 1.0,
+}
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache with a TTL for crop predictions, keyed on the
+    quantized Cdata vector. Safe to share between request threads.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0, precision: dict = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.precision = dict(DEFAULT_PRECISION, **(precision or {}))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped on clear() so results computed against an old model are not stored
+        self.generation = 0
+
+    def key(self, data) -> tuple:
+        return tuple(
+            int(round(getattr(data, field) / step))
+            for field, step in self.precision.items()
+        )
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, generation: int = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,11 +1,24 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import numpy as np
 import pandas as pd
-import random
 import os
+import time
+import copy
+import json
+import hashlib
+import threading
+import sklearn
 import uvicorn
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from npk.price_prediction.training import training_params, load_or_train, train_all
+from npk.price_prediction.columnar import open_store, csv_digest
+from npk.price_prediction.precompute import PrecomputedResponses
+from npk.price_prediction.ticker_stream import TickerHub
 
 app = FastAPI()
 
@@ -72,117 +85,421 @@ base = {
     "Wheat": 1350
 
 }
-commodity_list = []
-
 class Commodity:
-    def __init__(self, csv_name):
+    def __init__(self, csv_name, regressor=None, columns=None):
         self.name = csv_name
-        dataset = pd.read_csv(csv_name)
-        self.X = dataset.iloc[:, :-1].values
-        self.Y = dataset.iloc[:, 3].values
-
-        from sklearn.tree import DecisionTreeRegressor
-        depth = random.randrange(7, 18)
-        self.regressor = DecisionTreeRegressor(max_depth=depth)
-        self.regressor.fit(self.X, self.Y)
+        data_digest = None
+        key = self.getCropName().lower()
+        if columns is not None and key in columns.index["commodities"]:
+            # Zero-copy views into the shared memory-mapped store
+            self.X, self.Y = columns.slice(key)
+            data_digest = columns.digest(key)
+        else:
+            dataset = pd.read_csv(csv_name)
+            self.X = dataset.iloc[:, :-1].values
+            self.Y = dataset.iloc[:, 3].values
+            data_digest = csv_digest(csv_name)
+        self.data_digest = data_digest
+
+        self.params = training_params(self.getCropName())
+        if regressor is None:
+            self.regressor, self.trained = load_or_train(csv_name, self.X, self.Y, self.params, data_digest)
+        else:
+            self.regressor, self.trained = regressor, True
+        self.build_history_index()
+
+    def build_history_index(self):
+        """
+        (month, year) -> WPI for constant-time historical lookups, plus the
+        observations sorted by period (year * 12 + month) for range queries.
+        """
+        self.history = {}
+        for (month, year), wpi in zip(self.X[:, 0:2].tolist(), self.Y.tolist()):
+            # Keep the first row for a month, as the old list.index lookup did
+            self.history.setdefault((month, year), wpi)
+        periods = self.X[:, 1] * 12 + self.X[:, 0]
+        order = np.argsort(periods, kind="stable")
+        self.periods = periods[order]
+        self.period_rows = self.X[order, 0:2]
+        self.period_wpi = self.Y[order]
+
+    def history_range(self, start_year, end_year):
+        """
+        Observed (month, year, WPI) rows from January of start_year through
+        December of end_year.
+        """
+        lo = np.searchsorted(self.periods, start_year * 12 + 1, side="left")
+        hi = np.searchsorted(self.periods, end_year * 12 + 12, side="right")
+        return [
+            (int(month), int(year), float(wpi))
+            for (month, year), wpi in zip(self.period_rows[lo:hi].tolist(), self.period_wpi[lo:hi].tolist())
+        ]
 
     def getPredictedValue(self, value):
-        if value[1] >= 2019:
-            fsa = np.array(value).reshape(1, 3)
-            return self.regressor.predict(fsa)[0]
-        else:
-            c = self.X[:, 0:2]
-            x = [i.tolist() for i in c]
-            fsa = [value[0], value[1]]
-            ind = x.index(fsa) if fsa in x else -1
-            return self.Y[ind] if ind != -1 else None
+        predicted = self.predict_many([value])[0]
+        return None if np.isnan(predicted) else predicted
+
+    def predict_many(self, values):
+        """
+        WPI for an (n, 3) matrix of [month, year, rainfall] rows in one pass.
+        Rows before 2019 are looked up in the historical data (NaN when the
+        month is missing); the rest go through a single regressor call.
+        """
+        values = np.asarray(values, dtype=float).reshape(-1, 3)
+        predicted = np.full(len(values), np.nan)
+        modelled = values[:, 1] >= 2019
+        if modelled.any():
+            predicted[modelled] = self.regressor.predict(values[modelled])
+        if not modelled.all():
+            predicted[~modelled] = [
+                self.history.get((month, year), np.nan)
+                for month, year in values[~modelled, :2].tolist()
+            ]
+        return predicted
 
     def getCropName(self):
         return os.path.splitext(os.path.basename(self.name))[0]
 
-arhar = Commodity(commodity_dict["arhar"])
-commodity_list.append(arhar)
-bajra = Commodity(commodity_dict["bajra"])
-commodity_list.append(bajra)
-barley = Commodity(commodity_dict["barley"])
-commodity_list.append(barley)
-copra = Commodity(commodity_dict["copra"])
-commodity_list.append(copra)
-cotton = Commodity(commodity_dict["cotton"])
-commodity_list.append(cotton)
-sesamum = Commodity(commodity_dict["sesamum"])
-commodity_list.append(sesamum)
-gram = Commodity(commodity_dict["gram"])
-commodity_list.append(gram)
-groundnut = Commodity(commodity_dict["groundnut"])
-commodity_list.append(groundnut)
-jowar = Commodity(commodity_dict["jowar"])
-commodity_list.append(jowar)
-maize = Commodity(commodity_dict["maize"])
-commodity_list.append(maize)
-masoor = Commodity(commodity_dict["masoor"])
-commodity_list.append(masoor)
-moong = Commodity(commodity_dict["moong"])
-commodity_list.append(moong)
-niger = Commodity(commodity_dict["niger"])
-commodity_list.append(niger)
-paddy = Commodity(commodity_dict["paddy"])
-commodity_list.append(paddy)
-ragi = Commodity(commodity_dict["ragi"])
-commodity_list.append(ragi)
-rape = Commodity(commodity_dict["rape"])
-commodity_list.append(rape)
-jute = Commodity(commodity_dict["jute"])
-commodity_list.append(jute)
-safflower = Commodity(commodity_dict["safflower"])
-commodity_list.append(safflower)
-soyabean = Commodity(commodity_dict["soyabean"])
-commodity_list.append(soyabean)
-sugarcane = Commodity(commodity_dict["sugarcane"])
-commodity_list.append(sugarcane)
-sunflower = Commodity(commodity_dict["sunflower"])
-commodity_list.append(sunflower)
-urad = Commodity(commodity_dict["urad"])
-commodity_list.append(urad)
-wheat = Commodity(commodity_dict["wheat"])
-commodity_list.append(wheat)
+class CommodityStore:
+    """
+    All commodities, built once at load time and resolved by name.
+    """
+
+    def __init__(self, paths, columns=None):
+        self.commodities = {name: Commodity(path, columns=columns) for name, path in paths.items()}
+
+    def get(self, name):
+        return self.commodities[name.lower()]
+
+    def replace(self, name, commodity):
+        # Single dict assignment, so readers see the old or the new commodity
+        self.commodities[name.lower()] = commodity
+
+    def __contains__(self, name):
+        return name.lower() in self.commodities
+
+    def __iter__(self):
+        return iter(self.commodities.values())
+
+    def __len__(self):
+        return len(self.commodities)
+
+load_started = time.perf_counter()
+# Memory-mapped columnar copy of the CSVs, rebuilt here if missing or stale
+columnar_store = open_store(commodity_dict)
+store = CommodityStore(commodity_dict, columnar_store)
+print(
+    f"Loaded {len(store)} commodity models in {time.perf_counter() - load_started:.2f}s "
+    f"({sum(c.trained for c in store)} trained)"
+)
+
+# State of the last background retrain started from /admin/retrain
+retrain_status = {"running": False, "started_at": None, "finished_at": None, "report": None, "error": None}
+retrain_lock = threading.Lock()
+
+def swap_retrained(name, regressor, data_digest):
+    """
+    Install a regressor from a full retrain, unless the CSV changed since it
+    was read: an ingest refit for the newer rows is then queued behind this
+    call on refit_executor and must not be overwritten by the stale model.
+    """
+    commodity = Commodity(commodity_dict[name], regressor)
+    if commodity.data_digest != data_digest:
+        print(f"Skipping retrained {name}: its CSV changed during the retrain")
+        return
+    store.replace(name, commodity)
+
+def run_retrain(workers):
+    def on_fitted(name, regressor, fit_seconds, data_digest):
+        # Same single-worker executor as ingest refits, so swaps never interleave
+        refit_executor.submit(swap_retrained, name, regressor, data_digest).result()
+
+    try:
+        retrain_status["report"] = train_all(commodity_dict, workers, on_fitted)
+    except Exception as e:
+        print(f"Error retraining commodity models: {e}")
+        retrain_status["error"] = str(e)
+    finally:
+        forecast_cache.invalidate()
+        retrain_status["finished_at"] = datetime.now().isoformat()
+        retrain_status["running"] = False
+
+class WpiRow(BaseModel):
+    Month: int = Field(..., ge=1, le=12)
+    Year: int
+    Rainfall: float
+    WPI: float = Field(..., gt=0)
+
+class ScenarioRequest(BaseModel):
+    scenarios: int = Field(1000, ge=1, le=10000)
+    months: int = Field(12, ge=1, le=24)
+    distribution: str = Field("gamma", description="gamma, lognormal or normal around the monthly climatology")
+    cv: float = Field(0.3, gt=0, le=3, description="Coefficient of variation of monthly rainfall")
+    # Optional [p10, p50, p90] rainfall per calendar month (12 entries), overrides distribution
+    percentiles: Optional[List[List[float]]] = None
+    commodities: Optional[List[str]] = None
+    seed: Optional[int] = None
+
+# Commodities are scored concurrently; sklearn tree prediction releases the GIL
+scenario_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="market-scenario")
+
+def draw_rainfall(request, months, rng):
+    """
+    (scenarios, len(months)) rainfall draws, one column per forecast month.
+    """
+    n = request.scenarios
+    draws = np.empty((n, len(months)))
+    for column, (m, y) in enumerate(months):
+        if request.percentiles is not None:
+            p10, p50, p90 = request.percentiles[m - 1]
+            # Piecewise-linear inverse CDF through the given percentiles, tails extended linearly
+            quantiles = [0.0, 0.1, 0.5, 0.9, 1.0]
+            values = [p10 - (p50 - p10) / 4, p10, p50, p90, p90 + (p90 - p50) / 4]
+            draws[:, column] = np.interp(rng.random(n), quantiles, values)
+            continue
+        mean = annual_rainfall[m - 1]
+        if request.distribution == "gamma":
+            draws[:, column] = rng.gamma(1 / request.cv ** 2, mean * request.cv ** 2, n)
+        elif request.distribution == "lognormal":
+            sigma = np.sqrt(np.log(1 + request.cv ** 2))
+            draws[:, column] = rng.lognormal(np.log(mean) - sigma ** 2 / 2, sigma, n)
+        else:
+            draws[:, column] = rng.normal(mean, mean * request.cv, n)
+    return np.clip(draws, 0, None)
+
+# Single background worker: refits run one at a time, in the order they were ingested
+refit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="market-refit")
+ingest_lock = threading.Lock()
+refit_status = {}
+# (month, year) keys appended per commodity, so rows waiting on a refit are not duplicated
+ingested_keys = {}
+
+def append_wpi_rows(csv_name, rows):
+    """
+    Append rows to a commodity CSV, keeping its line endings, by writing a
+    new file and renaming it over the old one.
+    """
+    with open(csv_name, "rb") as csv_file:
+        content = csv_file.read()
+    newline = b"\r\n" if b"\r\n" in content else b"\n"
+    if content and not content.endswith(b"\n"):
+        content += newline
+    content += b"".join(f"{r.Month},{r.Year},{r.Rainfall},{r.WPI}".encode() + newline for r in rows)
+    tmp_name = f"{csv_name}.{os.getpid()}.tmp"
+    with open(tmp_name, "wb") as csv_file:
+        csv_file.write(content)
+    os.replace(tmp_name, csv_name)
+
+def refit_commodity(name):
+    refit_status[name] = {"state": "running", "started_at": datetime.now().isoformat()}
+    try:
+        started = time.perf_counter()
+        # Reads the updated CSV and trains (or loads) the model for its new hash
+        commodity = Commodity(commodity_dict[name])
+        store.replace(name, commodity)
+        forecast_cache.refresh(commodity)
+        refit_status[name].update(state="done", fit_seconds=round(time.perf_counter() - started, 4))
+    except Exception as e:
+        print(f"Error refitting {name}: {e}")
+        refit_status[name].update(state="failed", error=str(e))
+    refit_status[name]["finished_at"] = datetime.now().isoformat()
 
 @app.get("/")
 async def index():
     return {"message": "Welcome to the market place6"}
 
-@app.get("/dashboard")
-def dashboard():
+# Files written by 'python -m npk.price_prediction.precompute', served when up to date
+precomputed = PrecomputedResponses()
+
+def current_month_key():
+    return datetime.now().strftime("%Y-%m")
+
+def data_version():
+    """
+    Fingerprint of everything the forecasts depend on: each commodity's data
+    and hyperparameters, and the sklearn version that trains the trees.
+    """
+    digest = hashlib.sha256(sklearn.__version__.encode())
+    for name, commodity in sorted(store.commodities.items()):
+        digest.update(f"{name}:{commodity.data_digest}:{json.dumps(commodity.params, sort_keys=True)}".encode())
+    return digest.hexdigest()
+
+def serve_precomputed(request, key):
+    return precomputed.response(request, key, current_month_key(), data_version())
+
+def dashboard_payload():
     return {
         "top5": TopFiveWinners(),
         "bottom5": TopFiveLosers(),
         "sixmonths": SixMonthsForecast()
     }
 
+@app.get("/dashboard")
+def dashboard(request: Request):
+    return serve_precomputed(request, "dashboard") or dashboard_payload()
+
 @app.get("/commodity/{name}")
-def crop_profile(name: str):
-    max_crop, min_crop, forecast_crop_values = TwelveMonthsForecast(name)
-    prev_crop_values = TwelveMonthPrevious(name)
-    current_price = CurrentMonth(name)
-    crop_data = crop(name)
-    
+def crop_profile(name: str, request: Request):
+    if name not in store:
+        raise HTTPException(status_code=404, detail=f"Unknown commodity {name}")
+    return (
+        serve_precomputed(request, f"commodity/{name.lower()}")
+        or commodity_profile(name, PROFILE_FIELDS, forecast_cache.get())
+    )
+
+@app.get("/commodities")
+def crop_profiles(
+    names: str = Query(..., description="Comma-separated commodity names"),
+    fields: Optional[str] = Query(None, description="Comma-separated profile fields")
+):
+    """
+    Profiles for several commodities from one forecast cube, with only the
+    requested fields (by default everything except the *_x/*_y copies).
+    """
+    names = [name.strip() for name in names.split(",") if name.strip()]
+    unknown = [name for name in names if name not in store]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown commodities {unknown}")
+    selected = [field.strip() for field in fields.split(",")] if fields else DEFAULT_PROFILE_FIELDS
+    invalid = set(selected) - set(PROFILE_FIELDS)
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {sorted(invalid)}")
+    cube = forecast_cache.get()
+    return {"commodities": [commodity_profile(name, selected, cube) for name in names]}
+
+@app.get("/history/{name}")
+def crop_history(name: str, start_year: int = Query(2012), end_year: int = Query(2018)):
+    if name not in store:
+        raise HTTPException(status_code=404, detail=f"Unknown commodity {name}")
+    if end_year < start_year:
+        raise HTTPException(status_code=400, detail="end_year must not be before start_year")
+    commodity = store.get(name)
+    crop_base = base[commodity.getCropName()]
     return {
         "name": name,
-        "max_crop": max_crop,
-        "min_crop": min_crop,
-        "forecast_values": forecast_crop_values,
-        "forecast_x": [i[0] for i in forecast_crop_values],
-        "forecast_y": [i[1] for i in forecast_crop_values],
-        "previous_values": prev_crop_values,
-        "previous_x": [i[0] for i in prev_crop_values],
-        "previous_y": [i[1] for i in prev_crop_values],
-        "current_price": current_price,
-        "image_url": crop_data[0],
-        "prime_loc": crop_data[1],
-        "type_c": crop_data[2],
-        "export": crop_data[3]
+        "history": [
+            [datetime(year, month, 1).strftime("%b %y"), wpi, round(wpi * crop_base / 100, 2)]
+            for month, year, wpi in commodity.history_range(start_year, end_year)
+        ]
     }
 
+@app.post("/commodity/{name}/wpi")
+def ingest_wpi(name: str, rows: List[WpiRow]):
+    """
+    Append new monthly observations for one commodity and refit only its
+    model in the background. The current model keeps serving until the
+    refitted one is swapped in.
+    """
+    if name not in store:
+        raise HTTPException(status_code=404, detail=f"Unknown commodity {name}")
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to ingest")
+    name = name.lower()
+    with ingest_lock:
+        history = store.get(name).history
+        pending = ingested_keys.setdefault(name, set())
+        seen = set()
+        for row in rows:
+            key = (float(row.Month), float(row.Year))
+            if key in history or key in pending or key in seen:
+                raise HTTPException(status_code=409, detail=f"{name} already has WPI for {row.Month}/{row.Year}")
+            seen.add(key)
+        append_wpi_rows(commodity_dict[name], rows)
+        pending.update(seen)
+        refit_status[name] = {"state": "queued"}
+        refit_executor.submit(refit_commodity, name)
+    return {"name": name, "appended": len(rows), "refit": refit_status[name]}
+
+@app.get("/commodity/{name}/refit")
+def refit_progress(name: str):
+    return refit_status.get(name.lower(), {"state": "idle"})
+
+@app.post("/admin/retrain")
+def start_retrain(workers: int = Query(None, ge=1, le=64)):
+    """
+    Refit every commodity on a process pool in the background. Requests keep
+    being served by the current models, which are swapped in as fits finish.
+    """
+    with retrain_lock:
+        if retrain_status["running"]:
+            raise HTTPException(status_code=409, detail="A retrain is already running")
+        retrain_status.update(running=True, started_at=datetime.now().isoformat(), finished_at=None, report=None, error=None)
+    threading.Thread(target=run_retrain, args=(workers,), name="market-retrain", daemon=True).start()
+    return retrain_status
+
+@app.get("/admin/retrain")
+def retrain_progress():
+    return retrain_status
+
+@app.post("/scenarios")
+def rainfall_scenarios(request: ScenarioRequest):
+    """
+    Monte Carlo price bands: score every rainfall scenario for every month
+    and commodity, and return p10/p50/p90 prices per month.
+    """
+    if request.distribution not in ("gamma", "lognormal", "normal"):
+        raise HTTPException(status_code=400, detail="distribution must be gamma, lognormal or normal")
+    if request.percentiles is not None and (
+        len(request.percentiles) != 12 or any(len(p) != 3 or not p[0] <= p[1] <= p[2] for p in request.percentiles)
+    ):
+        raise HTTPException(status_code=400, detail="percentiles needs 12 ascending [p10, p50, p90] entries")
+    names = [name.lower() for name in (request.commodities or commodity_dict)]
+    unknown = [name for name in names if name not in store]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown commodities {unknown}")
+
+    started = time.perf_counter()
+    now = datetime.now()
+    months = []
+    for offset in range(1, request.months + 1):
+        months.append(((now.month - 1 + offset) % 12 + 1, now.year + (now.month - 1 + offset) // 12))
+    rainfall = draw_rainfall(request, months, np.random.default_rng(request.seed))
+
+    # One (scenarios * months, 3) matrix shared by every commodity
+    features = np.column_stack([
+        np.tile([float(m) for m, y in months], request.scenarios),
+        np.tile([y for m, y in months], request.scenarios),
+        rainfall.ravel(),
+    ])
+
+    def bands(name):
+        commodity = store.get(name)
+        wpi = commodity.predict_many(features).reshape(request.scenarios, len(months))
+        prices = wpi * base[commodity.getCropName()] / 100
+        p10, p50, p90 = np.percentile(prices, [10, 50, 90], axis=0).round(2).tolist()
+        return name, {"p10": p10, "p50": p50, "p90": p90}
+
+    return {
+        "months": [datetime(y, m, 1).strftime("%b %y") for m, y in months],
+        "scenarios": request.scenarios,
+        "bands": dict(scenario_executor.map(bands, names)),
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "forecast_cache": forecast_cache.stats(),
+        "ticker_stream": ticker_hub.stats(),
+        "precomputed": precomputed.stats(),
+    }
+
+@app.get("/ticker")
+def ticker_table(request: Request):
+    return serve_precomputed(request, "ticker") or {"sixmonths": SixMonthsForecast()}
+
+@app.get("/ticker/stream")
+async def ticker_stream():
+    """
+    Server-Sent Events feed of the six-month ticker table: a 'snapshot'
+    event on connect, then 'delta' events of [number, item, value] cells.
+    """
+    return StreamingResponse(
+        ticker_hub.events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/ticker/{item}/{number}")
 def ticker(item: int, number: int):
     data = SixMonthsForecast()
@@ -196,6 +513,49 @@ def ticker(item: int, number: int):
     except IndexError:
         raise HTTPException(status_code=400, detail="Invalid index")
 
+PROFILE_FIELDS = [
+    "max_crop", "min_crop", "forecast_values", "forecast_x", "forecast_y",
+    "previous_values", "previous_x", "previous_y", "current_price",
+    "image_url", "prime_loc", "type_c", "export"
+]
+# forecast_x/y and previous_x/y only repeat columns of the *_values lists
+DEFAULT_PROFILE_FIELDS = [field for field in PROFILE_FIELDS if not field.endswith(("_x", "_y"))]
+
+def commodity_profile(name, fields, cube):
+    """
+    Profile of one commodity limited to fields, computing only what they need.
+    The name is reported as its lowercase store key, matching the
+    precomputed files, whatever case it was requested in.
+    """
+    name = name.lower()
+    fields = set(fields)
+    values = {}
+    if fields & {"max_crop", "min_crop", "forecast_values", "forecast_x", "forecast_y"}:
+        max_crop, min_crop, forecast_crop_values = cube.twelve_months(name)
+        values.update(
+            max_crop=max_crop,
+            min_crop=min_crop,
+            forecast_values=forecast_crop_values,
+            forecast_x=[i[0] for i in forecast_crop_values],
+            forecast_y=[i[1] for i in forecast_crop_values],
+        )
+    if fields & {"previous_values", "previous_x", "previous_y"}:
+        prev_crop_values = TwelveMonthPrevious(name)
+        values.update(
+            previous_values=prev_crop_values,
+            previous_x=[i[0] for i in prev_crop_values],
+            previous_y=[i[1] for i in prev_crop_values],
+        )
+    if "current_price" in fields:
+        values["current_price"] = cube.current_price(name)
+    if fields & {"image_url", "prime_loc", "type_c", "export"}:
+        crop_data = crop(name)
+        values.update(image_url=crop_data[0], prime_loc=crop_data[1], type_c=crop_data[2], export=crop_data[3])
+
+    profile = {"name": name}
+    profile.update((field, values[field]) for field in PROFILE_FIELDS if field in fields)
+    return profile
+
 def crop(crop_name):
     crop_data = {
     "wheat":["/static/images/wheat.jpg", "U.P., Punjab, Haryana, Rajasthan, M.P., bihar", "rabi","Sri Lanka, United Arab Emirates, Taiwan"],
@@ -204,7 +564,7 @@ def crop(crop_name):
     "maize":["/static/images/maize.jpg", "Karnataka, Andhra Pradesh, Tamil Nadu, Rajasthan, Maharashtra", "kharif", "Hong Kong, United Arab Emirates, France"],
     "bajra":["/static/images/bajra.jpg", "Rajasthan, Maharashtra, Haryana, Uttar Pradesh and Gujarat", "kharif", "Oman, Saudi Arabia, Israel, Japan"],
     "copra":["/static/images/copra.jpg", "Kerala, Tamil Nadu, Karnataka, Andhra Pradesh, Orissa, West Bengal","rabi", "Veitnam, Bangladesh, Iran, Malaysia"],
-    "cotton":["/static/images/cotton.jpg", "Punjab, Haryana, Maharashtra, Tamil Nadu, Madhya Pradesh, Gujarat", " China, Bangladesh, Egypt"],
+    "cotton":["/static/images/cotton.jpg", "Punjab, Haryana, Maharashtra, Tamil Nadu, Madhya Pradesh, Gujarat", "kharif", " China, Bangladesh, Egypt"],
     "masoor":["/static/images/masoor.jpg", "Uttar Pradesh, Madhya Pradesh, Bihar, West Bengal, Rajasthan", "rabi", "Pakistan, Cyprus,United Arab Emirates"],
     "gram":["/static/images/gram.jpg", "Madhya Pradesh, Maharashtra, Rajasthan, Uttar Pradesh, Andhra Pradesh & Karnataka", "rabi", "Veitnam, Spain, Myanmar"],
     "groundnut":["/static/images/groundnut.jpg", "Andhra Pradesh, Gujarat, Tamil Nadu, Karnataka, and Maharashtra", "kharif", "Indonesia, Jordan, Iraq"],
@@ -224,219 +584,169 @@ def crop(crop_name):
     }
     return crop_data[crop_name]
 
+class ForecastCube:
+    """
+    WPI, price and percentage change for every commodity from last month to
+    twelve months ahead, computed with one regressor call per commodity.
+    Columns are month offsets -1 (last month), 0 (current month) and 1..12.
+    """
+
+    def __init__(self, commodities, year, month):
+        self.year = year
+        self.month = month
+        self.names = [c.getCropName() for c in commodities]
+        self.index = {name.lower(): i for i, name in enumerate(self.names)}
+
+        self.months = []
+        for offset in range(-1, 13):
+            m = (month - 1 + offset) % 12 + 1
+            y = year + (month - 1 + offset) // 12
+            self.months.append((m, y, annual_rainfall[m - 1]))
+        self.labels = [datetime(y, m, 1).strftime("%b %y") for m, y, r in self.months]
+
+        self.features = np.array([[float(m), y, r] for m, y, r in self.months])
+        self.wpi = np.array([c.predict_many(self.features) for c in commodities])
+        self._derive()
+
+    def with_commodity(self, commodity):
+        """
+        Copy of this cube with one commodity's row re-predicted; rows of the
+        other commodities are reused as they are.
+        """
+        cube = copy.copy(self)
+        cube.wpi = self.wpi.copy()
+        cube.wpi[self.index[commodity.getCropName().lower()]] = commodity.predict_many(self.features)
+        cube._derive()
+        return cube
+
+    def _derive(self):
+        bases = np.array([base[name] for name in self.names])
+        self.price = self.wpi * bases[:, np.newaxis] / 100
+        current = self.wpi[:, [1]]
+        self.change = (self.wpi - current) * 100 / current
+
+        # Derived tables are built once per cube and shared by every request
+        monthly_change = ((self.wpi[:, 1] - self.wpi[:, 0]) * 100 / self.wpi[:, 0]).tolist()
+        self.winners = self._top_five(monthly_change, reverse=True)
+        self.losers = self._top_five(monthly_change, reverse=False)
+        self.six_months = self._six_months()
+
+    def _top_five(self, monthly_change, reverse):
+        ranked = sorted(((perc, i) for i, perc in enumerate(monthly_change)), reverse=reverse)
+        return [
+            [self.names[i], round(float(self.price[i, 1]), 2), round(perc, 2)]
+            for perc, i in ranked[:5]
+        ]
+
+    def _six_months(self):
+        crop_month_wise = []
+        for column in range(2, 8):
+            month = sorted(
+                (round(float(self.price[i, column]), 2), round(float(self.change[i, column]), 2), name, self.labels[column])
+                for i, name in enumerate(self.names)
+            )
+            lowest, highest = month[0], month[-1]
+            crop_month_wise.append([lowest[3], highest[2], highest[0], highest[1], lowest[2], lowest[0], lowest[1]])
+        return crop_month_wise
+
+    def current_price(self, name):
+        return float(self.price[self.index[name.lower()], 1])
+
+    def twelve_months(self, name):
+        i = self.index[name.lower()]
+        prices = self.price[i, 2:]
+        crop_price = [
+            [label, round(float(price), 2), round(float(change), 2)]
+            for label, price, change in zip(self.labels[2:], prices, self.change[i, 2:])
+        ]
+        max_index = int(np.argmax(prices))
+        min_index = int(np.argmin(prices))
+        max_crop = [self.labels[2 + max_index], round(float(prices[max_index]), 2)]
+        min_crop = [self.labels[2 + min_index], round(float(prices[min_index]), 2)]
+        return max_crop, min_crop, crop_price
+
+
+class ForecastCache:
+    """
+    Holds the ForecastCube for the current calendar month and rebuilds it
+    on first use after the month rolls over.
+    """
+
+    def __init__(self):
+        self._cube = None
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = None
+
+    def get(self):
+        now = datetime.now()
+        cube = self._cube
+        if cube is not None and (cube.year, cube.month) == (now.year, now.month):
+            self.hits += 1
+            return cube
+        with self._lock:
+            cube = self._cube
+            if cube is None or (cube.year, cube.month) != (now.year, now.month):
+                self.misses += 1
+                started = time.perf_counter()
+                cube = ForecastCube(list(store), now.year, now.month)
+                self.build_seconds = time.perf_counter() - started
+                self.builds += 1
+                self._cube = cube
+            else:
+                self.hits += 1
+        return cube
+
+    def invalidate(self):
+        with self._lock:
+            self._cube = None
+
+    def refresh(self, commodity):
+        """
+        Swap in a cube where only this commodity's forecasts are recomputed.
+        """
+        with self._lock:
+            if self._cube is not None:
+                self._cube = self._cube.with_commodity(commodity)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "builds": self.builds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "build_seconds": self.build_seconds,
+        }
+
+forecast_cache = ForecastCache()
+
+# Pushes ticker changes to every /ticker/stream client from one asyncio task
+ticker_hub = TickerHub(lambda: forecast_cache.get().six_months)
+
 def TopFiveWinners():
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    current_rainfall = annual_rainfall[current_month - 1]
-    prev_month = current_month - 1
-    prev_rainfall = annual_rainfall[prev_month - 1]
-    current_month_prediction = []
-    prev_month_prediction = []
-    change = []
-
-    for i in commodity_list:
-        current_predict = i.getPredictedValue([float(current_month), current_year, current_rainfall])
-        current_month_prediction.append(current_predict)
-        prev_predict = i.getPredictedValue([float(prev_month), current_year, prev_rainfall])
-        prev_month_prediction.append(prev_predict)
-        change.append((((current_predict - prev_predict) * 100 / prev_predict), commodity_list.index(i)))
-    sorted_change = change
-    sorted_change.sort(reverse=True)
-    # print(sorted_change)
-    to_send = []
-    for j in range(0, 5):
-        perc, i = sorted_change[j]
-        name = commodity_list[i].getCropName()
-        to_send.append([name, round((current_month_prediction[i] * base[name]) / 100, 2), round(perc, 2)])
-    #print(to_send)
-    return to_send
+    return forecast_cache.get().winners
 
 def TopFiveLosers():
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    current_rainfall = annual_rainfall[current_month - 1]
-    prev_month = current_month - 1
-    prev_rainfall = annual_rainfall[prev_month - 1]
-    current_month_prediction = []
-    prev_month_prediction = []
-    change = []
-
-    for i in commodity_list:
-        current_predict = i.getPredictedValue([float(current_month), current_year, current_rainfall])
-        current_month_prediction.append(current_predict)
-        prev_predict = i.getPredictedValue([float(prev_month), current_year, prev_rainfall])
-        prev_month_prediction.append(prev_predict)
-        change.append((((current_predict - prev_predict) * 100 / prev_predict), commodity_list.index(i)))
-    sorted_change = change
-    sorted_change.sort()
-    to_send = []
-    for j in range(0, 5):
-        perc, i = sorted_change[j]
-        name = commodity_list[i].getCropName()
-        to_send.append([name, round((current_month_prediction[i] * base[name]) / 100, 2), round(perc, 2)])
-   # print(to_send)
-    return to_send
+    return forecast_cache.get().losers
 
 def SixMonthsForecast():
-    month1=[]
-    month2=[]
-    month3=[]
-    month4=[]
-    month5=[]
-    month6=[]
-    for i in commodity_list:
-        crop=SixMonthsForecastHelper(i.getCropName())
-        k=0
-        for j in crop:
-            time = j[0]
-            price = j[1]
-            change = j[2]
-            if k==0:
-                month1.append((price,change,i.getCropName(),time))
-            elif k==1:
-                month2.append((price,change,i.getCropName(),time))
-            elif k==2:
-                month3.append((price,change,i.getCropName(),time))
-            elif k==3:
-                month4.append((price,change,i.getCropName(),time))
-            elif k==4:
-                month5.append((price,change,i.getCropName(),time))
-            elif k==5:
-                month6.append((price,change,i.getCropName(),time))
-            k+=1
-    month1.sort()
-    month2.sort()
-    month3.sort()
-    month4.sort()
-    month5.sort()
-    month6.sort()
-    crop_month_wise=[]
-    crop_month_wise.append([month1[0][3],month1[len(month1)-1][2],month1[len(month1)-1][0],month1[len(month1)-1][1],month1[0][2],month1[0][0],month1[0][1]])
-    crop_month_wise.append([month2[0][3],month2[len(month2)-1][2],month2[len(month2)-1][0],month2[len(month2)-1][1],month2[0][2],month2[0][0],month2[0][1]])
-    crop_month_wise.append([month3[0][3],month3[len(month3)-1][2],month3[len(month3)-1][0],month3[len(month3)-1][1],month3[0][2],month3[0][0],month3[0][1]])
-    crop_month_wise.append([month4[0][3],month4[len(month4)-1][2],month4[len(month4)-1][0],month4[len(month4)-1][1],month4[0][2],month4[0][0],month4[0][1]])
-    crop_month_wise.append([month5[0][3],month5[len(month5)-1][2],month5[len(month5)-1][0],month5[len(month5)-1][1],month5[0][2],month5[0][0],month5[0][1]])
-    crop_month_wise.append([month6[0][3],month6[len(month6)-1][2],month6[len(month6)-1][0],month6[len(month6)-1][1],month6[0][2],month6[0][0],month6[0][1]])
-
-   # print(crop_month_wise)
-    return crop_month_wise
-
-def SixMonthsForecastHelper(name):
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    current_rainfall = annual_rainfall[current_month - 1]
-    name = os.path.splitext(os.path.basename(name))[0]
-    name = name.lower()
-    commodity = commodity_list[0]
-    for i in commodity_list:
-        if name == str(i):
-            commodity = i
-            break
-    month_with_year = []
-    for i in range(1, 7):
-        if current_month + i <= 12:
-            month_with_year.append((current_month + i, current_year, annual_rainfall[current_month + i - 1]))
-        else:
-            month_with_year.append((current_month + i - 12, current_year + 1, annual_rainfall[current_month + i - 13]))
-    wpis = []
-    current_wpi = commodity.getPredictedValue([float(current_month), current_year, current_rainfall])
-    change = []
-
-    for m, y, r in month_with_year:
-        current_predict = commodity.getPredictedValue([float(m), y, r])
-        wpis.append(current_predict)
-        change.append(((current_predict - current_wpi) * 100) / current_wpi)
-
-    crop_price = []
-    for i in range(0, len(wpis)):
-        m, y, r = month_with_year[i]
-        x = datetime(y, m, 1)
-        x = x.strftime("%b %y")
-        crop_price.append([x, round((wpis[i]* base[name.capitalize()]) / 100, 2) , round(change[i], 2)])
-
-    return crop_price
+    return forecast_cache.get().six_months
 
 def CurrentMonth(name):
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    current_rainfall = annual_rainfall[current_month - 1]
-    name = name.lower()
-    commodity = commodity_list[0]
-    for i in commodity_list:
-        if name == str(i):
-            commodity = i
-            break
-    current_wpi = commodity.getPredictedValue([float(current_month), current_year, current_rainfall])
-    current_price = (base[name.capitalize()]*current_wpi)/100
-    return current_price
+    return forecast_cache.get().current_price(name)
 
 def TwelveMonthsForecast(name):
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    current_rainfall = annual_rainfall[current_month - 1]
-    name = name.lower()
-    commodity = commodity_list[0]
-    for i in commodity_list:
-        if name == str(i):
-            commodity = i
-            break
-    month_with_year = []
-    for i in range(1, 13):
-        if current_month + i <= 12:
-            month_with_year.append((current_month + i, current_year, annual_rainfall[current_month + i - 1]))
-        else:
-            month_with_year.append((current_month + i - 12, current_year + 1, annual_rainfall[current_month + i - 13]))
-    max_index = 0
-    min_index = 0
-    max_value = 0
-    min_value = 9999
-    wpis = []
-    current_wpi = commodity.getPredictedValue([float(current_month), current_year, current_rainfall])
-    change = []
-
-    for m, y, r in month_with_year:
-        current_predict = commodity.getPredictedValue([float(m), y, r])
-        if current_predict > max_value:
-            max_value = current_predict
-            max_index = month_with_year.index((m, y, r))
-        if current_predict < min_value:
-            min_value = current_predict
-            min_index = month_with_year.index((m, y, r))
-        wpis.append(current_predict)
-        change.append(((current_predict - current_wpi) * 100) / current_wpi)
-
-    max_month, max_year, r1 = month_with_year[max_index]
-    min_month, min_year, r2 = month_with_year[min_index]
-    min_value = min_value * base[name.capitalize()] / 100
-    max_value = max_value * base[name.capitalize()] / 100
-    crop_price = []
-    for i in range(0, len(wpis)):
-        m, y, r = month_with_year[i]
-        x = datetime(y, m, 1)
-        x = x.strftime("%b %y")
-        crop_price.append([x, round((wpis[i]* base[name.capitalize()]) / 100, 2) , round(change[i], 2)])
-   # print("forecasr", wpis)
-    x = datetime(max_year,max_month,1)
-    x = x.strftime("%b %y")
-    max_crop = [x, round(max_value,2)]
-    x = datetime(min_year, min_month, 1)
-    x = x.strftime("%b %y")
-    min_crop = [x, round(min_value,2)]
-
-    return max_crop, min_crop, crop_price
+    return forecast_cache.get().twelve_months(name)
 
 def TwelveMonthPrevious(name):
     name = name.lower()
     current_month = datetime.now().month
     current_year = datetime.now().year
-    current_rainfall = annual_rainfall[current_month - 1]
-    commodity = commodity_list[0]
-    wpis = []
+    commodity = store.get(name)
     crop_price = []
-    for i in commodity_list:
-        if name == str(i):
-            commodity = i
-            break
     month_with_year = []
     for i in range(1, 13):
         if current_month - i >= 1:
@@ -444,19 +754,58 @@ def TwelveMonthPrevious(name):
         else:
             month_with_year.append((current_month - i + 12, current_year - 1, annual_rainfall[current_month - i + 11]))
 
-    for m, y, r in month_with_year:
-        current_predict = commodity.getPredictedValue([float(m), 2013, r])
-        wpis.append(current_predict)
+    wpis = commodity.predict_many([[float(m), y, r] for m, y, r in month_with_year]).tolist()
 
     for i in range(0, len(wpis)):
         m, y, r = month_with_year[i]
         x = datetime(y,m,1)
         x = x.strftime("%b %y")
-        crop_price.append([x, round((wpis[i]* base[name.capitalize()]) / 100, 2)])
+        # A month missing from the history has no WPI, and NaN is not valid JSON
+        price = round((wpis[i]* base[name.capitalize()]) / 100, 2) if np.isfinite(wpis[i]) else None
+        crop_price.append([x, price])
    # print("previous ", wpis)
     new_crop_price =[]
     for i in range(len(crop_price)-1,-1,-1):
         new_crop_price.append(crop_price[i])
     return new_crop_price
 
-    
\ No newline at end of file
+def benchmark_profile(name="wheat", repeats=50):
+    """
+    Per-request latency of GET /commodity/{name}, served live rather than
+    from precomputed files, with the forecast cube warm and rebuilt on every
+    request. Each is timed with months scored by predict_many, and one 1x3
+    regressor call per month as before it existed.
+    """
+    global precomputed
+    from fastapi.testclient import TestClient
+
+    client = TestClient(app)
+    vectorized = Commodity.predict_many
+
+    def per_month(self, values):
+        return np.concatenate([vectorized(self, [row]) for row in np.asarray(values, dtype=float).reshape(-1, 3)])
+
+    def median_ms(cold):
+        samples = []
+        for _ in range(repeats):
+            if cold:
+                forecast_cache.invalidate()
+            started = time.perf_counter()
+            client.get(f"/commodity/{name}").raise_for_status()
+            samples.append(time.perf_counter() - started)
+        return np.median(samples) * 1000
+
+    serving = precomputed
+    precomputed = PrecomputedResponses(root=os.devnull)
+    try:
+        for label, predict in [("per-month", per_month), ("predict_many", vectorized)]:
+            Commodity.predict_many = predict
+            print(f"/commodity/{name} {label:<13} warm cube {median_ms(False):8.3f} ms  cold cube {median_ms(True):8.3f} ms")
+    finally:
+        Commodity.predict_many = vectorized
+        precomputed = serving
+        forecast_cache.invalidate()
+
+if __name__ == "__main__":
+    # PYTHONPATH=src python -m npk.price_prediction.app
+    benchmark_profile()
@@ -0,0 +1,131 @@
+"""
+Columnar, memory-mapped copy of the commodity price CSVs.
+
+All static/*.csv files are stacked into one float64 array of shape
+(4, total_rows) (Month, Year, Rainfall, WPI) saved as .npy, plus a JSON
+index of each commodity's row range. The server memory-maps the array, so
+startup does no CSV parsing and every worker on a host shares the same
+pages. Rebuild it with:
+
+    PYTHONPATH=src python -m npk.price_prediction.columnar
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+STORE_DIR = Path(os.getenv("MARKET_STORE_DIR", Path(__file__).parent / "store"))
+COLUMNS = ["Month", "Year", "Rainfall", "WPI"]
+
+
+def csv_digest(csv_name):
+    digest = hashlib.sha256()
+    with open(csv_name, "rb") as csv_file:
+        digest.update(csv_file.read())
+    return digest.hexdigest()
+
+
+def build_store(paths, store_dir=STORE_DIR):
+    """
+    Convert every CSV in paths ({name: csv path}) into the columnar store.
+    Both files are written to temporary names and renamed into place.
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    blocks = []
+    index = {"columns": COLUMNS, "commodities": {}}
+    start = 0
+    for name, csv_name in paths.items():
+        dataset = pd.read_csv(csv_name)
+        block = dataset.iloc[:, :4].to_numpy(dtype=np.float64).T
+        blocks.append(block)
+        stat = os.stat(csv_name)
+        index["commodities"][name] = {
+            "start": start,
+            "stop": start + block.shape[1],
+            "source": str(csv_name),
+            "sha256": csv_digest(csv_name),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+        start += block.shape[1]
+
+    data = np.ascontiguousarray(np.concatenate(blocks, axis=1))
+    suffix = f".{os.getpid()}.tmp"
+    data_tmp = store_dir / f"wpi.npy{suffix}"
+    index_tmp = store_dir / f"wpi_index.json{suffix}"
+    with open(data_tmp, "wb") as data_file:
+        np.save(data_file, data)
+    with open(index_tmp, "w") as index_file:
+        json.dump(index, index_file)
+    # Data first: a reader that sees the new index always finds matching data
+    os.replace(data_tmp, store_dir / "wpi.npy")
+    os.replace(index_tmp, store_dir / "wpi_index.json")
+    return index
+
+
+class ColumnarStore:
+    def __init__(self, store_dir=STORE_DIR):
+        store_dir = Path(store_dir)
+        with open(store_dir / "wpi_index.json") as index_file:
+            self.index = json.load(index_file)
+        self.data = np.load(store_dir / "wpi.npy", mmap_mode="r")
+
+    def is_fresh(self, paths):
+        """
+        True when the store covers exactly these CSVs and none of them
+        changed size or mtime since it was built.
+        """
+        commodities = self.index["commodities"]
+        if set(commodities) != set(paths):
+            return False
+        for name, csv_name in paths.items():
+            try:
+                stat = os.stat(csv_name)
+            except OSError:
+                return False
+            entry = commodities[name]
+            if stat.st_size != entry["size"] or stat.st_mtime != entry["mtime"]:
+                return False
+        return True
+
+    def digest(self, name):
+        return self.index["commodities"][name]["sha256"]
+
+    def slice(self, name):
+        """
+        Zero-copy (X, Y) views for one commodity: X is (n, 3) Month, Year,
+        Rainfall and Y is the WPI column.
+        """
+        entry = self.index["commodities"][name]
+        block = self.data[:, entry["start"]:entry["stop"]]
+        return block[:3].T, block[3]
+
+
+def open_store(paths, store_dir=STORE_DIR):
+    """
+    Memory-map the columnar store, building or rebuilding it first when it
+    is missing or out of date. Returns None if it cannot be built.
+    """
+    try:
+        store = ColumnarStore(store_dir)
+        if store.is_fresh(paths):
+            return store
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        build_store(paths, store_dir)
+        return ColumnarStore(store_dir)
+    except (OSError, ValueError) as e:
+        print(f"Columnar store unavailable, reading CSVs instead: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    static_dir = Path(__file__).parent / "static"
+    csv_paths = {path.stem.lower(): str(path) for path in sorted(static_dir.glob("*.csv"))}
+    built = build_store(csv_paths)
+    total = max(entry["stop"] for entry in built["commodities"].values())
+    print(f"Stored {total} rows for {len(built['commodities'])} commodities in {STORE_DIR}")
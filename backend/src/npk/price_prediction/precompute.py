@@ -0,0 +1,166 @@
+"""
+Pre-rendered market responses.
+
+The job renders /dashboard, every /commodity/{name} profile and the ticker
+table into a new versioned directory of JSON files with gzip (and brotli,
+when installed) variants, then switches manifest.json to it with an atomic
+rename, so it is safe to run on a schedule while the server is live:
+
+    PYTHONPATH=src python -m npk.price_prediction.precompute
+"""
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PRECOMPUTED_DIR = Path(os.getenv("MARKET_PRECOMPUTED_DIR", Path(__file__).parent / "precomputed"))
+
+# Older version directories kept around for requests still reading them
+KEEP_VERSIONS = 2
+
+
+def encode_json(payload) -> bytes:
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def write_version(payloads: dict, month: str, data_version: str, root=PRECOMPUTED_DIR) -> dict:
+    """
+    Write payloads ({key: JSON-able object}) as a new version and point the
+    manifest at it. Returns the manifest.
+    """
+    root = Path(root)
+    version = f"{month}-{data_version[:12]}-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    version_dir = root / version
+    files = {}
+    for key, payload in payloads.items():
+        body = encode_json(payload)
+        path = version_dir / f"{key}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+        Path(f"{path}.gz").write_bytes(gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            Path(f"{path}.br").write_bytes(brotli.compress(body))
+        files[key] = {"path": f"{version}/{key}.json", "etag": hashlib.sha256(body).hexdigest()[:32]}
+
+    manifest = {
+        "version": version,
+        "month": month,
+        "data_version": data_version,
+        "created_at": datetime.now().isoformat(),
+        "files": files,
+    }
+    tmp_path = root / f"manifest.json.{os.getpid()}.tmp"
+    tmp_path.write_text(json.dumps(manifest))
+    os.replace(tmp_path, root / "manifest.json")
+
+    versions = sorted((path for path in root.iterdir() if path.is_dir()), key=lambda path: path.stat().st_mtime)
+    for stale in versions[:-KEEP_VERSIONS]:
+        if stale.name != version:
+            shutil.rmtree(stale, ignore_errors=True)
+    return manifest
+
+
+class PrecomputedResponses:
+    """
+    Serves pre-rendered files named in the manifest, picking the best
+    encoding the client accepts and answering If-None-Match with 304.
+    The manifest is re-read whenever its mtime changes.
+    """
+
+    def __init__(self, root=PRECOMPUTED_DIR):
+        self.root = Path(root)
+        self._manifest = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def manifest(self):
+        try:
+            mtime = (self.root / "manifest.json").stat().st_mtime
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                try:
+                    self._manifest = json.loads((self.root / "manifest.json").read_text())
+                    self._mtime = mtime
+                except (OSError, ValueError):
+                    return None
+        return self._manifest
+
+    def response(self, request, key, month: str, data_version: str):
+        """
+        Response for key, or None when there is no up-to-date file for it
+        and the caller should compute the payload live.
+        """
+        manifest = self.manifest()
+        entry = manifest["files"].get(key) if manifest else None
+        if entry is None or manifest["month"] != month or manifest["data_version"] != data_version:
+            self.misses += 1
+            return None
+
+        accepted = request.headers.get("accept-encoding", "")
+        path = self.root / entry["path"]
+        candidates = []
+        if brotli is not None and "br" in accepted:
+            candidates.append(("br", f"{path}.br"))
+        if "gzip" in accepted:
+            candidates.append(("gzip", f"{path}.gz"))
+        candidates.append((None, str(path)))
+
+        for encoding, file_path in candidates:
+            try:
+                with open(file_path, "rb") as body_file:
+                    body = body_file.read()
+            except OSError:
+                continue
+            # Strong validator per representation
+            etag = f'"{entry["etag"]}-{encoding}"' if encoding else f'"{entry["etag"]}"'
+            headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "public, max-age=300"}
+            self.hits += 1
+            if etag in request.headers.get("if-none-match", ""):
+                return Response(status_code=304, headers=headers)
+            if encoding:
+                headers["Content-Encoding"] = encoding
+            return Response(content=body, media_type="application/json", headers=headers)
+
+        self.misses += 1
+        return None
+
+    def stats(self):
+        manifest = self.manifest()
+        return {
+            "version": manifest["version"] if manifest else None,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def main():
+    from npk.price_prediction import app as market
+
+    cube = market.forecast_cache.get()
+    payloads = {
+        "dashboard": market.dashboard_payload(),
+        "ticker": {"sixmonths": cube.six_months},
+    }
+    for name in market.commodity_dict:
+        payloads[f"commodity/{name}"] = market.commodity_profile(name, market.PROFILE_FIELDS, cube)
+    manifest = write_version(payloads, market.current_month_key(), market.data_version())
+    print(f"Wrote {len(payloads)} responses to {PRECOMPUTED_DIR / manifest['version']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import json
+import time
+import asyncio
+from fastapi.concurrency import run_in_threadpool
+
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class TickerHub:
+    """
+    Fans the six-month ticker table out to Server-Sent Events clients.
+
+    One asyncio task polls load_table() and, when the table changes,
+    encodes the changed cells once and pushes that message onto every
+    client's bounded queue. A client whose queue is full gets its backlog
+    replaced by a fresh snapshot instead of blocking the others.
+    """
+
+    def __init__(self, load_table, interval: float = 5.0, queue_size: int = 16):
+        self.load_table = load_table
+        self.interval = interval
+        self.queue_size = queue_size
+        self.clients = set()
+        self._table = None
+        self._snapshot = None
+        self._task = None
+        self.broadcasts = 0
+        self.resyncs = 0
+        self.last_fanout_seconds = None
+
+    async def subscribe(self) -> asyncio.Queue:
+        if self._snapshot is None:
+            await self.refresh()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        queue.put_nowait(self._snapshot)
+        self.clients.add(queue)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.clients.discard(queue)
+
+    async def _run(self):
+        try:
+            while self.clients:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing ticker stream: {e}")
+        finally:
+            self._task = None
+
+    async def refresh(self):
+        # Building the table may rebuild the forecast cube, keep that off the loop
+        table = await run_in_threadpool(self.load_table)
+        if table is self._table:
+            return
+        previous = self._table
+        self._table = table
+        self._snapshot = sse_message("snapshot", table)
+        if previous is None:
+            return
+        if len(previous) != len(table) or any(len(a) != len(b) for a, b in zip(previous, table)):
+            self._broadcast(self._snapshot)
+            return
+        changes = [
+            [number, item, value]
+            for number, row in enumerate(table)
+            for item, value in enumerate(row)
+            if previous[number][item] != value
+        ]
+        if changes:
+            self._broadcast(sse_message("delta", changes))
+
+    def _broadcast(self, message):
+        started = time.perf_counter()
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client: drop what it has not read and resync it
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot)
+                self.resyncs += 1
+        self.broadcasts += 1
+        self.last_fanout_seconds = time.perf_counter() - started
+
+    async def events(self, keepalive: float = 15.0):
+        """
+        SSE body for one client: a snapshot, then deltas as they happen.
+        """
+        queue = await self.subscribe()
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+    def stats(self):
+        return {
+            "connections": len(self.clients),
+            "broadcasts": self.broadcasts,
+            "resyncs": self.resyncs,
+            "last_fanout_seconds": self.last_fanout_seconds,
+        }
@@ -0,0 +1,156 @@
+"""
+Training and on-disk caching of the commodity price regressors.
+
+Kept free of FastAPI and app state so process-pool workers can import it
+cheaply. Retrain every commodity from the command line with:
+
+    PYTHONPATH=src python -m npk.price_prediction.training --workers 4
+"""
+import os
+import json
+import time
+import hashlib
+import io
+import pickle
+import random
+import argparse
+import multiprocessing
+import pandas as pd
+import sklearn
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from npk.price_prediction.columnar import csv_digest
+from sklearn.tree import DecisionTreeRegressor
+
+# Fixed seed so every process and every restart trains the same trees
+TRAINING_SEED = 42
+
+# Trained regressors are cached here, keyed by CSV contents and hyperparameters
+MODEL_CACHE_DIR = Path(os.getenv("MARKET_MODEL_DIR", Path(__file__).parent / "models"))
+
+STATIC_DIR = Path(__file__).parent / "static"
+
+
+def crop_name_of(csv_name):
+    return os.path.splitext(os.path.basename(csv_name))[0]
+
+
+def training_params(crop_name):
+    """
+    Hyperparameters for one commodity. The depth is still drawn from 7-17,
+    but from a generator seeded per commodity so it is reproducible.
+    """
+    depth = random.Random(f"{TRAINING_SEED}:{crop_name}").randrange(7, 18)
+    return {"max_depth": depth, "random_state": TRAINING_SEED}
+
+
+def model_cache_path(csv_name, params, data_digest=None):
+    """
+    Artifact path for a commodity, keyed by the SHA-256 of its CSV (pass
+    data_digest to skip re-hashing), its hyperparameters and sklearn version.
+    """
+    digest = hashlib.sha256()
+    digest.update((data_digest or csv_digest(csv_name)).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(sklearn.__version__.encode())
+    return MODEL_CACHE_DIR / f"{crop_name_of(csv_name)}-{digest.hexdigest()[:16]}.pkl"
+
+
+def save_model(path, regressor):
+    try:
+        MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so concurrent workers never read a partial file
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as model_file:
+            pickle.dump(regressor, model_file)
+        os.replace(tmp_path, path)
+        for stale in MODEL_CACHE_DIR.glob(f"{path.name.rsplit('-', 1)[0]}-*.pkl"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Could not cache model {path}: {e}")
+
+
+def fit_regressor(X, Y, params):
+    regressor = DecisionTreeRegressor(**params)
+    regressor.fit(X, Y)
+    return regressor
+
+
+def load_or_train(csv_name, X, Y, params, data_digest=None):
+    """
+    Load the cached regressor for this CSV and hyperparameters, training and
+    caching it only when the data or the parameters changed.
+    Returns (regressor, trained).
+    """
+    path = model_cache_path(csv_name, params, data_digest)
+    if path.exists():
+        try:
+            with open(path, "rb") as model_file:
+                return pickle.load(model_file), False
+        except Exception as e:
+            print(f"Ignoring unreadable model cache {path}: {e}")
+
+    regressor = fit_regressor(X, Y, params)
+    save_model(path, regressor)
+    return regressor, True
+
+
+def fit_commodity(name, csv_name):
+    """
+    Process-pool task: read one commodity CSV, fit its regressor and cache it.
+    Returns (name, regressor, fit_seconds, data_digest), where data_digest is
+    the SHA-256 of the exact CSV contents the regressor was fitted on.
+    """
+    with open(csv_name, "rb") as csv_file:
+        content = csv_file.read()
+    data_digest = hashlib.sha256(content).hexdigest()
+    dataset = pd.read_csv(io.BytesIO(content))
+    X = dataset.iloc[:, :-1].values
+    Y = dataset.iloc[:, 3].values
+    params = training_params(crop_name_of(csv_name))
+    started = time.perf_counter()
+    regressor = fit_regressor(X, Y, params)
+    fit_seconds = time.perf_counter() - started
+    save_model(model_cache_path(csv_name, params, data_digest), regressor)
+    return name, regressor, fit_seconds, data_digest
+
+
+def train_all(paths, workers=None, on_fitted=None):
+    """
+    Fit every commodity in paths ({name: csv path}) across a process pool.
+    on_fitted(name, regressor, fit_seconds, data_digest) runs in the calling process as
+    each fit completes. Returns {name: fit_seconds} plus the wall time.
+    """
+    workers = workers or min(len(paths), os.cpu_count() or 1)
+    fit_times = {}
+    started = time.perf_counter()
+    # spawn: never fork a serving process that may be running threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(fit_commodity, name, csv_name) for name, csv_name in paths.items()]
+        for future in as_completed(futures):
+            name, regressor, fit_seconds, data_digest = future.result()
+            fit_times[name] = round(fit_seconds, 4)
+            if on_fitted is not None:
+                on_fitted(name, regressor, fit_seconds, data_digest)
+    return {
+        "workers": workers,
+        "wall_seconds": round(time.perf_counter() - started, 4),
+        "fit_seconds": fit_times,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain all commodity price models")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size, defaults to the CPU count")
+    args = parser.parse_args()
+
+    paths = {path.stem.lower(): str(path) for path in sorted(STATIC_DIR.glob("*.csv"))}
+    report = train_all(paths, args.workers)
+    for name, fit_seconds in sorted(report["fit_seconds"].items()):
+        print(f"  {name:<12}{fit_seconds:8.4f}s")
+    print(f"Trained {len(paths)} commodities on {report['workers']} workers in {report['wall_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
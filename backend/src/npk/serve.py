@@ -0,0 +1,192 @@
+"""
+Pre-forking server for npk.main.
+
+Every sub-app and model is loaded once in the parent process, then worker
+processes are forked so the read-only model pages are shared copy-on-write
+instead of being loaded again per worker:
+
+    PYTHONPATH=src python -m npk.serve --workers 4
+
+--measure-unshared also starts one worker from scratch, without the
+preloaded parent, so the memory report compares against a measured
+unshared worker instead of an estimate.
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+import multiprocessing
+import uvicorn
+
+# Seconds to let workers finish booting before the memory report is printed
+REPORT_DELAY = 5.0
+
+# Pause before replacing a worker that died, so a crashing worker cannot spin
+RESPAWN_DELAY = 1.0
+
+
+def unique_memory(pid="self"):
+    """
+    Unique set size (private clean + private dirty pages) of a process in
+    bytes, or None where /proc/<pid>/smaps_rollup is not available.
+    """
+    try:
+        total = 0
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                    total += int(line.split()[1]) * 1024
+        return total
+    except (OSError, ValueError):
+        return None
+
+
+def load_unshared_worker(conn):
+    """
+    Runs in a freshly spawned process: load the app and every sub-app the
+    way a worker without a preloaded parent would, and send back its USS.
+    """
+    from npk.main import sub_apps
+    from npk.lazy_mount import warmup
+
+    warmup(sub_apps)
+    gc.collect()
+    conn.send(unique_memory())
+    conn.close()
+
+
+def measure_unshared_worker():
+    """
+    USS of a worker that loaded everything itself, or None if it failed.
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=load_unshared_worker, args=(sender,))
+    process.start()
+    sender.close()
+    try:
+        return receiver.recv()
+    except EOFError:
+        return None
+    finally:
+        process.join()
+
+
+def print_memory_report(preload_uss, workers, unshared_uss=None):
+    def mb(value):
+        return f"{value / 1e6:10.1f} MB" if value is not None else "       n/a"
+
+    worker_uss = {pid: unique_memory(pid) for pid in workers}
+    print("Worker memory (USS):")
+    print(f"  preloaded parent  {mb(preload_uss)}")
+    for pid, uss in worker_uss.items():
+        print(f"  worker {pid:<10} {mb(uss)}")
+    if unshared_uss is not None:
+        print(f"  unshared worker   {mb(unshared_uss)}  (measured, loaded without the parent)")
+    if preload_uss is None or None in worker_uss.values():
+        return
+    if unshared_uss is not None:
+        unshared = unshared_uss * len(workers)
+        basis = f"{len(workers)} x measured unshared worker"
+    else:
+        # Every worker would hold its own copy of the preloaded state
+        unshared = preload_uss * len(workers)
+        basis = f"estimate: {len(workers)} x preloaded parent, see --measure-unshared"
+    shared = preload_uss + sum(worker_uss.values())
+    print(f"  without sharing   {mb(unshared)}  ({basis})")
+    print(f"  with sharing      {mb(shared)}  (parent + workers)")
+
+
+def run_worker(app, sock):
+    config = uvicorn.Config(app, log_level="info")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def fork_worker(app, sock) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # Drop the parent's handlers; uvicorn installs its own
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        run_worker(app, sock)
+        os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve npk.main from pre-forked workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--measure-unshared", action="store_true",
+                        help="Load one worker without the preloaded parent to measure its memory")
+    args = parser.parse_args()
+
+    from npk.main import app, sub_apps
+    from npk.lazy_mount import warmup, print_import_breakdown
+
+    if not hasattr(os, "fork"):
+        print("os.fork is not available on this platform, serving from a single process")
+        uvicorn.run(app, host=args.host, port=args.port)
+        return
+
+    # Load everything up front so the workers inherit it
+    warmup(sub_apps)
+    print_import_breakdown(sub_apps)
+    # Keep the collector from touching (and so copying) the preloaded objects in workers
+    gc.collect()
+    gc.freeze()
+    preload_uss = unique_memory()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Before forking, so the measurement does not compete with booting workers
+    unshared_uss = measure_unshared_worker() if args.measure_unshared else None
+
+    workers = [fork_worker(app, sock) for _ in range(args.workers)]
+    print(f"Serving on http://{args.host}:{args.port} with {len(workers)} workers")
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    time.sleep(REPORT_DELAY)
+    print_memory_report(preload_uss, workers, unshared_uss)
+
+    # Replace workers that die until we are asked to stop
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if pid not in workers:
+            continue
+        workers.remove(pid)
+        if stopping:
+            continue
+        print(f"Worker {pid} exited with code {os.waitstatus_to_exitcode(status)}, starting a replacement")
+        time.sleep(RESPAWN_DELAY)
+        if not stopping:
+            workers.append(fork_worker(app, sock))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
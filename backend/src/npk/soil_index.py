@@ -0,0 +1,87 @@
+import time
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+
+class SoilProfileIndex:
+    """
+    KD-tree over z-score normalized soil features, so each of the seven
+    fields weighs the same in the distance regardless of its units.
+    """
+
+    def __init__(self, features: np.ndarray, labels: np.ndarray, columns: list, leaf_size: int = 40):
+        self.columns = list(columns)
+        self.features = np.asarray(features, dtype=float)
+        self.labels = np.asarray(labels)
+        self.mean = self.features.mean(axis=0)
+        self.scale = self.features.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.tree = KDTree(self.normalize(self.features), leaf_size=leaf_size)
+
+    @classmethod
+    def from_csv(cls, path, columns: list, label_column: str = "label"):
+        dataset = pd.read_csv(path)
+        return cls(dataset[columns].to_numpy(dtype=float), dataset[label_column].to_numpy(), columns)
+
+    def normalize(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=float) - self.mean) / self.scale
+
+    def query(self, X, k: int = 5) -> list:
+        """
+        Return, per query row, the k nearest samples with their label and
+        distance in the normalized feature space.
+        """
+        k = min(k, len(self.features))
+        distances, indices = self.tree.query(self.normalize(X), k=k)
+        results = []
+        for row_distances, row_indices in zip(distances.tolist(), indices.tolist()):
+            neighbors = []
+            for distance, index in zip(row_distances, row_indices):
+                sample = dict(zip(self.columns, self.features[index].tolist()))
+                sample["label"] = str(self.labels[index])
+                sample["distance"] = distance
+                neighbors.append(sample)
+            results.append(neighbors)
+        return results
+
+
+def benchmark(features: np.ndarray, labels: np.ndarray, columns: list, sizes=(10000, 100000, 1000000, 5000000), k: int = 5):
+    """
+    Scale the dataset synthetically (resampled rows plus 1% noise) and time
+    index build, single-row and 1000-row batch queries at each size.
+    """
+    rng = np.random.default_rng(0)
+    spread = features.std(axis=0) * 0.01
+    queries = features[rng.integers(0, len(features), 1000)]
+    for size in sizes:
+        picks = rng.integers(0, len(features), size)
+        synthetic = features[picks] + rng.normal(0, 1, (size, features.shape[1])) * spread
+
+        started = time.perf_counter()
+        index = SoilProfileIndex(synthetic, labels[picks], columns)
+        build = time.perf_counter() - started
+
+        single = []
+        for row in queries[:200]:
+            started = time.perf_counter()
+            index.tree.query(index.normalize(row[np.newaxis, :]), k=k)
+            single.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        index.tree.query(index.normalize(queries), k=k)
+        batch = time.perf_counter() - started
+
+        print(
+            f"rows={size:>9} build={build:7.2f}s "
+            f"single_p50={np.median(single) * 1000:.3f}ms single_p99={np.percentile(single, 99) * 1000:.3f}ms "
+            f"batch_1000={batch * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    # Query latency as the dataset grows:
+    #   PYTHONPATH=src python -m npk.soil_index
+    columns = ["N", "P", "K", "ph", "temperature", "humidity", "rainfall"]
+    dataset = pd.read_csv("src/npk/Crop_recommendation.csv")
+    benchmark(dataset[columns].to_numpy(dtype=float), dataset["label"].to_numpy(), columns)
@@ -0,0 +1,166 @@
+import os
+import time
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+
+logger = logging.getLogger(__name__)
+
+# "compiled" evaluates the flattened trees below, "sklearn" calls classifier.predict
+ENGINE = os.getenv("CROP_ENGINE", "compiled").lower()
+
+# Only plain averaged trees: boosting weights and bagging feature subsets are not modelled
+SUPPORTED_CLASSIFIERS = (DecisionTreeClassifier, RandomForestClassifier, ExtraTreesClassifier)
+
+# Every compiled model is checked against classifier.predict on these rows before use
+PARITY_DATASET = Path(__file__).parent / "Crop_recommendation.csv"
+PARITY_COLUMNS = ["N", "P", "K", "ph", "temperature", "humidity", "rainfall"]
+
+
+class CompiledTreeClassifier:
+    """
+    Array-backed copy of a fitted sklearn tree classifier.
+
+    Every tree of a DecisionTreeClassifier, RandomForestClassifier or
+    ExtraTreesClassifier is packed into flat NumPy arrays (feature index,
+    threshold, children, normalized leaf values) and all rows walk all trees
+    at once, one depth level per step. Predictions match classifier.predict.
+    """
+
+    def __init__(self, classifier):
+        if not isinstance(classifier, SUPPORTED_CLASSIFIERS):
+            raise ValueError(f"{type(classifier).__name__} cannot be compiled")
+        estimators = getattr(classifier, "estimators_", [classifier])
+        if getattr(classifier, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output classifiers can be compiled")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            # Leaves point at themselves so finished rows stay put
+            node_ids = np.arange(tree.node_count) + offset
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            value = tree.value[:, 0, :]
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        self.classes_ = classifier.classes_
+        self.n_features_in_ = classifier.n_features_in_
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.children_left = np.concatenate(lefts).astype(np.intp)
+        self.children_right = np.concatenate(rights).astype(np.intp)
+        self.value = np.concatenate(values)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = max_depth
+
+    def apply(self, X) -> np.ndarray:
+        """
+        Return the (n_rows, n_trees) matrix of leaf node ids reached by X.
+        """
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input of shape (n, {self.n_features_in_}), got {X.shape}")
+        # NaN would always branch right, where sklearn raises or routes missing values itself
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+
+        nodes = np.repeat(self.roots[np.newaxis, :], len(X), axis=0)
+        rows = np.arange(len(X))[:, np.newaxis]
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], len(self.classes_)))
+        # Accumulate tree by tree, in estimator order, as sklearn does
+        for column in range(leaves.shape[1]):
+            proba += self.value[leaves[:, column]]
+        return proba / leaves.shape[1]
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def load_engine(classifier):
+    """
+    Return the object used for crop predictions: the compiled engine when
+    enabled, supported by the model and in agreement with classifier.predict
+    on PARITY_DATASET, otherwise the sklearn classifier.
+    """
+    if ENGINE != "compiled":
+        logger.info("Using sklearn engine for crop predictions")
+        return classifier
+    try:
+        engine = CompiledTreeClassifier(classifier)
+        X = pd.read_csv(PARITY_DATASET)[PARITY_COLUMNS].to_numpy(dtype=float)
+        mismatches = check_parity(engine, classifier, X)
+    except (AttributeError, ValueError, OSError, KeyError) as e:
+        logger.warning(f"Falling back to sklearn engine: {str(e)}")
+        return classifier
+    if mismatches:
+        logger.warning(f"Falling back to sklearn engine: {mismatches} of {len(X)} parity rows disagree")
+        return classifier
+    logger.info(f"Using compiled engine for crop predictions ({len(engine.roots)} trees)")
+    return engine
+
+
+def check_parity(engine, classifier, X) -> int:
+    """
+    Return the number of rows where the engine disagrees with classifier.predict.
+    """
+    return int(np.sum(engine.predict(X) != classifier.predict(X)))
+
+
+def benchmark(predict, X, repeats: int = 200) -> dict:
+    """
+    Time single-row and whole-batch predictions, in milliseconds.
+    """
+    single = []
+    for i in range(repeats):
+        row = X[i % len(X):i % len(X) + 1]
+        started = time.perf_counter()
+        predict(row)
+        single.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    predict(X)
+    batch = time.perf_counter() - started
+    return {
+        "single_row_p50_ms": float(np.median(single) * 1000),
+        "single_row_p99_ms": float(np.percentile(single, 99) * 1000),
+        "batch_ms": batch * 1000,
+        "batch_rows": len(X),
+    }
+
+
+if __name__ == "__main__":
+    # Parity check and microbenchmark over Crop_recommendation.csv:
+    #   PYTHONPATH=src python -m npk.tree_engine
+    import pickle
+
+    with open("src/npk/model.pkl", "rb") as model_file:
+        classifier = pickle.load(model_file)
+    X = pd.read_csv(PARITY_DATASET)[PARITY_COLUMNS].to_numpy(dtype=float)
+
+    engine = CompiledTreeClassifier(classifier)
+    mismatches = check_parity(engine, classifier, X)
+    print(f"parity: {mismatches} mismatches over {len(X)} rows")
+    for name, predict in [("sklearn", classifier.predict), ("compiled", engine.predict)]:
+        print(name, benchmark(predict, X))
@@ -0,0 +1,49 @@
+import os
+import sys
+import pickle
+import pytest
+import pandas as pd
+from pathlib import Path
+from sklearn.tree import DecisionTreeClassifier
+
+# The backend runs with PYTHONPATH=src; do the same for the tests
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "src"))
+
+DATASET_PATH = BACKEND_DIR / "src" / "npk" / "Crop_recommendation.csv"
+CSV_FEATURE_COLUMNS = ["N", "P", "K", "ph", "temperature", "humidity", "rainfall"]
+
+
+@pytest.fixture(scope="session")
+def crop_classifier():
+    dataset = pd.read_csv(DATASET_PATH)
+    classifier = DecisionTreeClassifier(random_state=0)
+    classifier.fit(dataset[CSV_FEATURE_COLUMNS].to_numpy(dtype=float), dataset["label"])
+    return classifier
+
+
+@pytest.fixture(scope="session")
+def main_app(crop_classifier, tmp_path_factory):
+    # model.pkl is not checked in; point the app at a freshly fitted tree
+    model_path = tmp_path_factory.mktemp("models") / "model.pkl"
+    with open(model_path, "wb") as model_file:
+        pickle.dump(crop_classifier, model_file)
+    os.environ["CROP_MODEL_PATH"] = str(model_path)
+    from npk.main import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def market(tmp_path_factory):
+    """
+    The market sub-app module, with its model cache, columnar store and
+    precomputed responses in temporary directories. Commodity CSV paths are
+    relative to backend/, as when the server runs from there.
+    """
+    root = tmp_path_factory.mktemp("market")
+    for variable, directory in [("MARKET_MODEL_DIR", "models"), ("MARKET_STORE_DIR", "store"),
+                                ("MARKET_PRECOMPUTED_DIR", "precomputed")]:
+        os.environ[variable] = str(root / directory)
+    os.chdir(BACKEND_DIR)
+    from npk.price_prediction import app as market_module
+    return market_module
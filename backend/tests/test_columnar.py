@@ -0,0 +1,57 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import BACKEND_DIR
+from npk.price_prediction.columnar import ColumnarStore, build_store, csv_digest, open_store
+
+STATIC_DIR = BACKEND_DIR / "src" / "npk" / "price_prediction" / "static"
+
+
+@pytest.fixture
+def csv_paths(tmp_path):
+    paths = {}
+    for name in ["Wheat", "Paddy"]:
+        shutil.copy(STATIC_DIR / f"{name}.csv", tmp_path / f"{name}.csv")
+        paths[name.lower()] = str(tmp_path / f"{name}.csv")
+    return paths
+
+
+def test_slices_match_the_csvs(csv_paths, tmp_path):
+    build_store(csv_paths, tmp_path / "store")
+    store = ColumnarStore(tmp_path / "store")
+    assert isinstance(store.data, np.memmap)
+    assert store.is_fresh(csv_paths)
+    for name, csv_name in csv_paths.items():
+        dataset = pd.read_csv(csv_name)
+        X, Y = store.slice(name)
+        np.testing.assert_array_equal(X, dataset.iloc[:, :3].to_numpy(dtype=float))
+        np.testing.assert_array_equal(Y, dataset.iloc[:, 3].to_numpy(dtype=float))
+        assert store.digest(name) == csv_digest(csv_name)
+
+
+def test_store_goes_stale_when_a_csv_changes(csv_paths, tmp_path):
+    build_store(csv_paths, tmp_path / "store")
+    store = ColumnarStore(tmp_path / "store")
+
+    with open(csv_paths["wheat"], "a") as csv_file:
+        csv_file.write("1,2019,20.0,160.0\n")
+    assert not store.is_fresh(csv_paths)
+
+    # open_store rebuilds it, and the new row is there
+    rebuilt = open_store(csv_paths, tmp_path / "store")
+    assert rebuilt.is_fresh(csv_paths)
+    X, Y = rebuilt.slice("wheat")
+    assert X[-1].tolist() == [1.0, 2019.0, 20.0] and Y[-1] == 160.0
+    assert rebuilt.digest("wheat") == csv_digest(csv_paths["wheat"])
+
+
+def test_store_goes_stale_on_mtime_or_commodity_set(csv_paths, tmp_path):
+    build_store(csv_paths, tmp_path / "store")
+    store = ColumnarStore(tmp_path / "store")
+    stat = os.stat(csv_paths["paddy"])
+    os.utime(csv_paths["paddy"], (stat.st_atime, stat.st_mtime + 10))
+    assert not store.is_fresh(csv_paths)
+    assert not store.is_fresh({"wheat": csv_paths["wheat"]})
+    assert not store.is_fresh(dict(csv_paths, paddy=str(tmp_path / "missing.csv")))
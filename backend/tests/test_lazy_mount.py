@@ -0,0 +1,42 @@
+import logging
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from npk.lazy_mount import LazyApp, warmup
+
+
+def mounted(module: str) -> TestClient:
+    app = FastAPI()
+    app.mount("/sub", LazyApp(module))
+    return TestClient(app)
+
+
+def test_failed_import_returns_503():
+    response = mounted("npk.does_not_exist").get("/sub/")
+    assert response.status_code == 503
+    assert "npk.does_not_exist" in response.json()["detail"]
+
+
+def test_first_request_imports_and_reports_time(tmp_path, monkeypatch, caplog):
+    (tmp_path / "lazy_sub_app.py").write_text(
+        "from fastapi import FastAPI\n"
+        "app = FastAPI()\n"
+        "@app.get('/')\n"
+        "def index():\n"
+        "    return {'message': 'sub-app'}\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sub_app = LazyApp("lazy_sub_app")
+    app = FastAPI()
+    app.mount("/sub", sub_app)
+    assert not sub_app.loaded
+
+    with caplog.at_level(logging.INFO, logger="npk.lazy_mount"):
+        response = TestClient(app).get("/sub/")
+    assert response.json() == {"message": "sub-app"}
+    assert sub_app.loaded and sub_app.load_seconds is not None
+    assert any("Imported lazy_sub_app in" in record.getMessage() for record in caplog.records)
+
+
+def test_warmup_reports_errors_per_path():
+    report = warmup({"/missing": LazyApp("npk.does_not_exist")})
+    assert report["/missing"].startswith("error: ")
@@ -0,0 +1,140 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+BASE = {"N": 90, "P": 42, "K": 43, "PH": 6.5, "Temp": 20.9, "Humidity": 82.0, "Rain": 202.9}
+
+
+@pytest.fixture
+def client(main_app):
+    return TestClient(main_app)
+
+
+def expected_crops(classifier, rows):
+    fields = ["N", "P", "K", "PH", "Temp", "Humidity", "Rain"]
+    return classifier.predict([[row[field] for field in fields] for row in rows]).tolist()
+
+
+def test_sweep_grid(client):
+    response = client.post("/predict/sweep", json={
+        "base": BASE,
+        "axes": [{"field": "N", "start": 0, "stop": 100, "step": 10}, {"field": "PH", "start": 5, "stop": 7, "step": 0.5}],
+    })
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert len(body["axes"]["N"]) == 11 and len(body["axes"]["PH"]) == 5
+    assert len(body["grid"]) == 11 and len(body["grid"][0]) == 5
+
+
+def test_sweep_rejects_huge_axis_before_allocating(client):
+    response = client.post("/predict/sweep", json={
+        "base": BASE,
+        "axes": [{"field": "N", "start": 0, "stop": 1e12, "step": 1}],
+    })
+    assert response.status_code == 400
+    assert "limit" in response.json()["detail"]
+
+
+def test_sweep_rejects_overflowing_product(client):
+    axis = {"start": 0, "stop": 1e7, "step": 1e-3}
+    response = client.post("/predict/sweep", json={
+        "base": BASE,
+        "axes": [dict(axis, field=field) for field in ["N", "P", "K"]],
+    })
+    assert response.status_code == 400
+    assert "limit" in response.json()["detail"]
+
+
+def test_predict_csv_reports_chunk_timings(client):
+    from conftest import DATASET_PATH
+    with open(DATASET_PATH, "rb") as csv_file:
+        response = client.post("/predict/csv", params={"chunk_size": 1000}, files={"file": ("soil.csv", csv_file, "text/csv")})
+    assert response.status_code == 200, response.text
+    lines = response.text.splitlines()
+    comments = [line for line in lines if line.startswith("#")]
+    assert len([line for line in comments if line.startswith("# chunk=")]) == 3
+    assert comments[-1].startswith("# total_rows=2200 ")
+    assert lines[0].endswith(",predicted_crop")
+
+
+def test_predict_batch_json_and_ndjson(client, crop_classifier):
+    rows = [BASE, dict(BASE, N=10, Rain=40.0), dict(BASE, K=200, Temp=30.0)]
+    expected = expected_crops(crop_classifier, rows)
+
+    response = client.post("/predict/batch", json=rows)
+    assert response.status_code == 200, response.text
+    assert response.json()["Predicted Crops"] == expected
+
+    ndjson = "\n".join(json.dumps(row) for row in rows)
+    response = client.post("/predict/batch", content=ndjson, headers={"Content-Type": "application/x-ndjson"})
+    assert response.json()["Predicted Crops"] == expected
+
+
+@pytest.mark.parametrize("content_type", ["application/json", "application/x-ndjson"])
+def test_predict_batch_stream(client, crop_classifier, content_type):
+    rows = [BASE, dict(BASE, N=10, Rain=40.0)]
+    if content_type == "application/json":
+        body = json.dumps(rows)
+    else:
+        body = "\n".join(json.dumps(row) for row in rows) + "\n"
+    response = client.post("/predict/batch", params={"stream": True}, content=body, headers={"Content-Type": content_type})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    predicted = [json.loads(line)["Predicted Crop"] for line in response.text.splitlines()]
+    assert predicted == expected_crops(crop_classifier, rows)
+
+
+def test_predict_batch_stream_reports_bad_records_in_band(client):
+    response = client.post("/predict/batch", params={"stream": True}, json={"N": 1})
+    assert response.status_code == 200
+    assert "error" in json.loads(response.text.splitlines()[-1])
+
+
+def test_batch_endpoints_score_off_the_loop(client):
+    from npk import offload
+    completed = offload.cpu_executor.stats()["completed"]
+    rows = [BASE, dict(BASE, N=10, Rain=40.0)]
+    batch = client.post("/predict/batch", json=rows)
+    assert batch.status_code == 200, batch.text
+    assert len(batch.json()["Predicted Crops"]) == 2
+
+    neighbors = client.post("/predict/neighbors/batch", params={"k": 3}, json=rows)
+    assert neighbors.status_code == 200, neighbors.text
+    assert [len(found) for found in neighbors.json()["neighbors"]] == [3, 3]
+
+    assert client.get("/admin/executor").json()["executor"]["completed"] == completed + 2
+
+
+def test_batch_endpoints_return_503_when_executor_is_full(client, monkeypatch):
+    from npk import offload
+    monkeypatch.setattr(offload.cpu_executor, "pending", offload.cpu_executor.workers + offload.cpu_executor.queue_size)
+    response = client.post("/predict/batch", json=[BASE])
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+@pytest.mark.parametrize("start, stop, step, length", [
+    (0, 1, 0.1, 11),
+    (0.1, 0.7, 0.2, 4),
+    (1e9, 1e9 + 0.3, 0.1, 4),
+    (1e9, 1e9 + 0.35, 0.1, 4),
+])
+def test_sweep_axis_length_matches_the_grid(client, start, stop, step, length):
+    response = client.post("/predict/sweep", json={
+        "base": BASE,
+        "axes": [{"field": "Rain", "start": start, "stop": stop, "step": step}],
+    })
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert len(body["axes"]["Rain"]) == len(body["grid"]) == length
+    assert body["axes"]["Rain"][-1] <= stop + step * 1e-6
+
+
+def test_sweep_rejects_nan_base_value(client):
+    response = client.post(
+        "/predict/sweep",
+        content='{"base": {"N": NaN, "P": 42, "K": 43, "PH": 6.5, "Temp": 20.9, "Humidity": 82.0, "Rain": 202.9},'
+                ' "axes": [{"field": "PH", "start": 5, "stop": 7, "step": 0.5}]}',
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status_code == 400
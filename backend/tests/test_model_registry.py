@@ -0,0 +1,71 @@
+import os
+import pytest
+from npk.model_registry import ModelRegistry
+
+
+def read_text(path):
+    with open(path) as model_file:
+        content = model_file.read()
+    if content == "broken":
+        raise ValueError("corrupt artifact")
+    return content
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "model.txt"
+    path.write_text("v1")
+    return path
+
+
+def bump_mtime(path, content):
+    path.write_text(content)
+    stat = os.stat(path)
+    # Coarse filesystem timestamps could otherwise hide the change
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+
+def test_reload_changed_picks_up_a_new_mtime(artifact):
+    registry = ModelRegistry()
+    registry.register("model", str(artifact), read_text)
+    assert registry.reload_changed() == []
+
+    bump_mtime(artifact, "v2")
+    assert registry.reload_changed() == ["model"]
+    assert registry.get("model") == "v2"
+    assert registry.stats()["models"]["model"]["version"] == 2
+
+
+def test_failed_reload_keeps_the_old_model(artifact):
+    registry = ModelRegistry()
+    registry.register("model", str(artifact), read_text)
+
+    bump_mtime(artifact, "broken")
+    registry.reload_changed()
+    stats = registry.stats()["models"]["model"]
+    assert registry.get("model") == "v1"
+    assert stats["version"] == 1
+    assert stats["last_error"] == "corrupt artifact"
+    with pytest.raises(ValueError):
+        registry.reload("model", raise_errors=True)
+
+    bump_mtime(artifact, "v3")
+    registry.reload_changed()
+    assert registry.get("model") == "v3"
+    assert registry.stats()["models"]["model"]["last_error"] is None
+
+
+def test_on_swap_runs_after_every_successful_load(artifact):
+    swapped = []
+    registry = ModelRegistry()
+    registry.register("model", str(artifact), read_text, on_swap=swapped.append)
+    bump_mtime(artifact, "broken")
+    registry.reload("model")
+    bump_mtime(artifact, "v2")
+    registry.reload("model")
+    assert swapped == ["v1", "v2"]
+
+
+def test_register_raises_on_a_missing_artifact(tmp_path):
+    with pytest.raises(OSError):
+        ModelRegistry().register("model", str(tmp_path / "missing.pkl"), read_text)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from npk.ndvi_fusion import check_parity, fuse_sentinel_ndvi, synthetic_series
+from npk.ndvi_prediction import create_data
+
+
+def assert_parity(vh, vv, ndvi, cloud_threshold):
+    expected = create_data(vh.copy(), vv.copy(), ndvi.copy(), cloud_threshold).reset_index(drop=True)
+    actual = fuse_sentinel_ndvi(vh, vv, ndvi, cloud_threshold)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-9)
+    return actual
+
+
+@pytest.mark.parametrize("n_rows", [100, 1000, 10000])
+@pytest.mark.parametrize("cloud_threshold", [20.0, 50.0, 100.0])
+def test_matches_create_data(n_rows, cloud_threshold):
+    vh, vv, ndvi = synthetic_series(n_rows, seed=n_rows)
+    if (ndvi["cloudCoveragePercent"] > cloud_threshold).all():
+        with pytest.raises(ValueError):
+            create_data(vh.copy(), vv.copy(), ndvi.copy(), cloud_threshold)
+        with pytest.raises(ValueError):
+            fuse_sentinel_ndvi(vh, vv, ndvi, cloud_threshold)
+        return
+    fused = assert_parity(vh, vv, ndvi, cloud_threshold)
+    assert len(fused) == n_rows
+
+
+def test_synthetic_series_of_1000_rows():
+    vh, vv, ndvi = synthetic_series(1000)
+    assert check_parity(vh, vv, ndvi, 100.0, create_data)
+
+
+def test_shuffled_input():
+    vh, vv, ndvi = synthetic_series(1000, seed=3)
+    assert_parity(
+        vh.sample(frac=1, random_state=1),
+        vv.sample(frac=1, random_state=2),
+        ndvi.sample(frac=1, random_state=3),
+        50.0,
+    )
+
+
+def test_duplicate_ndvi_dates():
+    vh, vv, ndvi = synthetic_series(1000, seed=3)
+    # Second observations on existing dates, with different values
+    duplicates = ndvi.iloc[[2, 4]].assign(mean=[0.2, 0.3], cloudCoveragePercent=0.0)
+    ndvi = pd.concat([ndvi, duplicates], ignore_index=True)
+    for cloud_threshold in [50.0, 100.0]:
+        assert_parity(vh, vv, ndvi, cloud_threshold)
+
+
+def test_sentinel_rows_outside_the_ndvi_span():
+    vh, vv, ndvi = synthetic_series(1000, seed=3)
+    # Clear observations only in the middle; rows before and after are
+    # snapped to the ends of the clear span
+    ndvi = ndvi.iloc[2:5].assign(cloudCoveragePercent=0.0)
+    fused = assert_parity(vh, vv, ndvi, 50.0)
+    first, last = ndvi["mean"].iloc[0], ndvi["mean"].iloc[-1]
+    assert (fused["ndvi"].iloc[:10] == first).all() and (fused["ndvi"].iloc[-10:] == last).all()
+
+
+def test_single_clear_observation_gives_nan():
+    vh, vv, ndvi = synthetic_series(1000, seed=3)
+    ndvi = ndvi.assign(cloudCoveragePercent=90.0)
+    ndvi.loc[3, "cloudCoveragePercent"] = 5.0
+    # interp1d cannot interpolate from one point; create_data yields NaN
+    fused = assert_parity(vh, vv, ndvi, 20.0)
+    assert fused["ndvi"].isna().all()
+    assert np.isfinite(fused["cloudCoveragePercent"]).all()
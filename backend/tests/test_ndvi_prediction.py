@@ -0,0 +1,114 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from npk.ndvi_fusion import synthetic_series
+from npk.ndvi_prediction import app
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def triplet():
+    vh, vv, ndvi = synthetic_series(1000)
+    # Alternate clear and cloudy observations so both code paths run
+    ndvi["cloudCoveragePercent"] = np.where(np.arange(len(ndvi)) % 2 == 0, 5.0, 90.0)
+    return vh, vv, ndvi
+
+
+def upload(vh, vv, ndvi):
+    return {
+        "vh_file": ("vh.csv", vh.to_csv(index=False), "text/csv"),
+        "vv_file": ("vv.csv", vv.to_csv(index=False), "text/csv"),
+        "ndvi_file": ("ndvi.csv", ndvi.to_csv(index=False), "text/csv"),
+    }
+
+
+def test_ndvipredict_valid_triplet(client, triplet):
+    response = client.post("/ndvipredict", params={"cloud_threshold": 20}, files=upload(*triplet))
+    assert response.status_code == 200, response.text
+    body = response.json()
+    summary = body["summary"]
+    assert summary["total_predictions"] == 1000
+    assert summary["cloudy_predictions"] > 0 and summary["clear_predictions"] > 0
+    assert {row["prediction_type"] for row in body["predictions"]} == {"actual", "predicted"}
+
+    # The same upload by hash, with another threshold
+    again = client.post("/ndvipredict", params={"cloud_threshold": 95, "upload_id": body["upload_id"]})
+    assert again.status_code == 200, again.text
+    assert again.json()["summary"]["cloudy_predictions"] == 0
+
+
+def test_ndvipredict_missing_column(client, triplet):
+    vh, vv, ndvi = triplet
+    response = client.post("/ndvipredict", files=upload(vh, vv, ndvi.drop(columns="cloudCoveragePercent")))
+    assert response.status_code == 400
+    assert "Missing columns in ndvi file" in response.json()["detail"]
+
+
+def test_ndvipredict_sweep(client, triplet):
+    response = client.post("/ndvipredict/sweep", params={"thresholds": [1, 20, 95]}, files=upload(*triplet))
+    assert response.status_code == 200, response.text
+    results = response.json()["thresholds"]
+    assert "error" in results[0]
+    assert results[1]["summary"]["total_predictions"] == 1000
+
+
+def test_ndvipredict_batch_long_format(client, triplet):
+    vh, vv, ndvi = triplet
+    files = {
+        name: (f"{name}.csv", frame.assign(field_id=field).to_csv(index=False), "text/csv")
+        for name, frame, field in [("vh_file", vh, "a"), ("vv_file", vv, "a"), ("ndvi_file", ndvi, "a")]
+    }
+    response = client.post("/ndvipredict/batch", params={"cloud_threshold": 20}, files=files)
+    assert response.status_code == 200, response.text
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["field_id"] for line in lines] == ["a"]
+    assert lines[0]["summary"]["total_predictions"] == 1000
+
+
+def test_ndvipredict_missing_sar_value_on_clear_row(client, triplet):
+    vh, vv, ndvi = triplet
+    vh = vh.copy()
+    vh.loc[0, "mean"] = np.nan
+    # Everything is clear at this threshold, so the NaN row is never scored
+    response = client.post("/ndvipredict", params={"cloud_threshold": 95}, files=upload(vh, vv, ndvi))
+    assert response.status_code == 200, response.text
+    assert response.json()["summary"]["cloudy_predictions"] == 0
+
+
+def test_ndvipredict_batch_scores_all_fields_in_one_call(client, triplet, monkeypatch):
+    from npk.model_registry import registry
+    entry = registry._entries["corr_model"]
+    model = entry.model
+    calls = []
+
+    class CountingModel:
+        def predict(self, features):
+            calls.append(len(features))
+            return model.predict(features)
+
+    monkeypatch.setattr(entry, "model", CountingModel())
+
+    def long_format(frame, field_ids):
+        return pd.concat([frame.assign(field_id=field_id) for field_id in field_ids]).to_csv(index=False)
+
+    vh, vv, ndvi = triplet
+    fields = ["a", "b", "c", "d"]
+    # Field "e" has SAR rows but no NDVI, so it fails to fuse and is reported on its own
+    files = {
+        "vh_file": ("vh.csv", long_format(vh, fields + ["e"]), "text/csv"),
+        "vv_file": ("vv.csv", long_format(vv, fields + ["e"]), "text/csv"),
+        "ndvi_file": ("ndvi.csv", long_format(ndvi, fields), "text/csv"),
+    }
+    response = client.post("/ndvipredict/batch", params={"cloud_threshold": 20}, files=files)
+    assert response.status_code == 200, response.text
+    lines = {line["field_id"]: line for line in map(json.loads, response.text.splitlines())}
+    assert sorted(lines) == fields + ["e"]
+    assert "error" in lines["e"]
+    assert all(lines[field]["summary"]["total_predictions"] == 1000 for field in fields)
+    assert calls == [sum(lines[field]["summary"]["cloudy_predictions"] for field in fields)]
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from npk.offload import BoundedExecutor, LoopLagMonitor
+
+
+def test_rejects_past_workers_plus_queue():
+    executor = BoundedExecutor(workers=1, queue_size=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.run(release.wait))
+        queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as rejected:
+            await executor.run(lambda: "rejected")
+        stats = executor.stats()
+        release.set()
+        return rejected.value, stats, await running, await queued
+
+    rejected, stats, running, queued = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "1"
+    assert (running, queued) == (True, "queued")
+    assert stats["running"] == 1 and stats["queued"] == 1 and stats["max_queued"] == 1
+    assert stats["rejected"] == 1
+
+    # Capacity is released once the jobs finish
+    assert asyncio.run(executor.run(lambda: 42)) == 42
+    assert executor.stats()["completed"] == 3
+    assert executor.stats()["queued"] == 0
+
+
+def test_errors_propagate_and_release_the_slot():
+    executor = BoundedExecutor(workers=1, queue_size=0)
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(executor.run(fail))
+    assert asyncio.run(executor.run(lambda: "ok")) == "ok"
+    assert executor.stats()["rejected"] == 0
+
+
+def test_loop_monitor_restarts_on_a_new_loop():
+    monitor = LoopLagMonitor(interval=0.01)
+
+    async def sample():
+        monitor.start()
+        # A second start on the same loop keeps the running task
+        task = monitor._task
+        monitor.start()
+        assert monitor._task is task
+        await asyncio.sleep(0.1)
+        return monitor.stats()["samples"]
+
+    assert asyncio.run(sample()) > 0
+    first_task = monitor._task
+    # The first loop is closed; the next one must get its own task
+    assert asyncio.run(sample()) > 0
+    assert monitor._task is not first_task
+
+
+def test_admin_executor_payload(main_app):
+    with TestClient(main_app) as client:
+        body = client.get("/admin/executor").json()
+    assert set(body) == {"executor", "event_loop"}
+    assert {"workers", "queue_size", "running", "queued", "max_queued", "completed", "rejected", "busy_seconds"} <= set(body["executor"])
+    assert {"samples", "last_seconds", "p50_seconds", "p99_seconds", "max_seconds"} <= set(body["event_loop"])
@@ -0,0 +1,67 @@
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+from npk.price_prediction.precompute import PrecomputedResponses, write_version
+
+PAYLOAD = {"name": "wheat", "source": "precomputed"}
+
+
+@pytest.fixture
+def client(market):
+    return TestClient(market.app)
+
+
+@pytest.fixture
+def serve_from(market, monkeypatch, tmp_path):
+    monkeypatch.setattr(market, "precomputed", PrecomputedResponses(tmp_path))
+
+    def write(month=None, data_version=None):
+        return write_version(
+            {"commodity/wheat": PAYLOAD},
+            month or market.current_month_key(),
+            data_version or market.data_version(),
+            root=tmp_path,
+        )
+    return write
+
+
+def test_each_encoding_has_its_own_etag(client, serve_from):
+    serve_from()
+    gzipped = client.get("/commodity/wheat", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/commodity/wheat", headers={"Accept-Encoding": "identity"})
+    assert gzipped.json() == plain.json() == PAYLOAD
+    assert gzipped.headers["Content-Encoding"] == "gzip" and "Content-Encoding" not in plain.headers
+    assert gzipped.headers["ETag"] != plain.headers["ETag"]
+    assert gzipped.headers["ETag"].endswith('-gzip"')
+    assert gzipped.headers["Vary"] == "Accept-Encoding"
+
+
+def test_matching_if_none_match_is_not_modified(client, serve_from):
+    serve_from()
+    etag = client.get("/commodity/wheat", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    cached = client.get("/commodity/wheat", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    # The gzip validator does not match the identity representation
+    other = client.get("/commodity/wheat", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert other.status_code == 200
+
+
+def test_stale_files_fall_back_to_the_live_response(market, client, serve_from):
+    serve_from(data_version="0" * 64)
+    live = client.get("/commodity/wheat")
+    assert "ETag" not in live.headers and "max_crop" in live.json()
+
+    last_month = datetime(2000, 1, 1).strftime("%Y-%m")
+    serve_from(month=last_month)
+    assert "max_crop" in client.get("/commodity/wheat").json()
+
+    # Keys missing from the manifest are computed live as well
+    serve_from()
+    assert client.get("/commodity/paddy").json()["name"] == "paddy"
+    assert market.precomputed.stats()["misses"] >= 3
+
+
+def test_old_versions_are_pruned(serve_from, tmp_path):
+    versions = [serve_from()["version"] for _ in range(4)]
+    remaining = sorted(path.name for path in tmp_path.iterdir() if path.is_dir())
+    assert versions[-1] in remaining and len(remaining) == 2
@@ -0,0 +1,63 @@
+import pickle
+from npk import prediction_cache as cache_module
+from npk.Data import Cdata
+from npk.model_registry import ModelRegistry
+from npk.prediction_cache import PredictionCache
+
+BASE = {"N": 90, "P": 42, "K": 43, "PH": 6.5, "Temp": 20.9, "Humidity": 82.0, "Rain": 202.9}
+
+
+def test_readings_within_a_step_share_a_key():
+    cache = PredictionCache()
+    key = cache.key(Cdata(**BASE))
+    # PH quantizes in steps of 0.1, rounded to the nearest step
+    assert cache.key(Cdata(**dict(BASE, PH=6.46))) == key
+    assert cache.key(Cdata(**dict(BASE, PH=6.54))) == key
+    assert cache.key(Cdata(**dict(BASE, PH=6.44))) != key
+    assert cache.key(Cdata(**dict(BASE, PH=6.56))) != key
+    # A custom step widens the bucket
+    coarse = PredictionCache(precision={"PH": 1.0})
+    assert coarse.key(Cdata(**dict(BASE, PH=5.6))) == coarse.key(Cdata(**dict(BASE, PH=6.4))) != coarse.key(Cdata(**dict(BASE, PH=5.4)))
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = PredictionCache(ttl=10)
+    cache.put("key", "rice")
+    now[0] += 10
+    assert cache.get("key") == "rice"
+    now[0] += 0.5
+    assert cache.get("key") is None
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = PredictionCache(maxsize=2)
+    cache.put("a", "rice")
+    cache.put("b", "maize")
+    assert cache.get("a") == "rice"
+    cache.put("c", "jute")
+    assert cache.get("b") is None
+    assert cache.get("a") == "rice" and cache.get("c") == "jute"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_model_swap_bumps_generation(tmp_path):
+    model_path = tmp_path / "model.pkl"
+    model_path.write_bytes(pickle.dumps("v1"))
+    cache = PredictionCache()
+    registry = ModelRegistry()
+    registry.register("crop", str(model_path), lambda path: pickle.loads(open(path, "rb").read()),
+                      on_swap=lambda model: cache.clear())
+    cache.put("key", "rice")
+    generation = cache.generation
+
+    registry.reload("crop")
+    assert cache.get("key") is None
+    assert cache.generation == generation + 1
+    # A prediction computed against the old model is not stored
+    cache.put("key", "rice", generation)
+    assert cache.get("key") is None
+    cache.put("key", "maize", cache.generation)
+    assert cache.get("key") == "maize"
@@ -0,0 +1,202 @@
+import numpy as np
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(market):
+    return TestClient(market.app)
+
+
+def freeze_month(monkeypatch, market, year, month):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(year, month, 15, 12, 0)
+
+    monkeypatch.setattr(market, "datetime", FrozenDatetime)
+
+
+def test_predict_many_matches_per_month_lookups(market):
+    commodity = market.store.get("wheat")
+    history = [row.tolist() for row in commodity.X[:, 0:2]]
+    rows = [[float(m), year, market.annual_rainfall[m - 1]] for year in (2012, 2015, 2019, 2027) for m in range(1, 13)]
+
+    def per_month(value):
+        # getPredictedValue before predict_many: a 1x3 predict per modelled
+        # month, the first matching history row otherwise
+        if value[1] >= 2019:
+            return commodity.regressor.predict(np.array(value).reshape(1, 3))[0]
+        key = [value[0], value[1]]
+        return commodity.Y[history.index(key)] if key in history else np.nan
+
+    np.testing.assert_array_equal(commodity.predict_many(rows), [per_month(row) for row in rows])
+    # Jan-Mar 2012 precede the history
+    assert np.isnan(commodity.predict_many(rows[:3])).all()
+    assert commodity.getPredictedValue(rows[0]) is None
+
+
+def test_previous_months_use_their_own_year(market, monkeypatch):
+    freeze_month(monkeypatch, market, 2016, 3)
+    previous = market.TwelveMonthPrevious("wheat")
+    commodity = market.store.get("wheat")
+    assert [label for label, price in previous][0] == "Mar 15" and previous[-1][0] == "Feb 16"
+    assert previous[0][1] == round(commodity.history[(3.0, 2015.0)] * market.base["Wheat"] / 100, 2)
+
+
+def test_previous_months_without_history_are_null(market, client, monkeypatch):
+    # Feb and Mar 2012 are not in the history
+    freeze_month(monkeypatch, market, 2013, 2)
+    response = client.get("/commodity/wheat")
+    assert response.status_code == 200, response.text
+    previous = dict(response.json()["previous_values"])
+    assert previous["Feb 12"] is None and previous["Mar 12"] is None
+    assert previous["Apr 12"] is not None
+
+
+def test_forecast_cache_rebuilds_when_the_month_rolls_over(market, monkeypatch):
+    cache = market.ForecastCache()
+    freeze_month(monkeypatch, market, 2026, 1)
+    january = cache.get()
+    assert cache.get() is january
+    assert (january.year, january.month) == (2026, 1) and january.labels[2] == "Feb 26"
+
+    freeze_month(monkeypatch, market, 2026, 2)
+    february = cache.get()
+    assert february is not january
+    assert (february.year, february.month) == (2026, 2) and february.labels[2] == "Mar 26"
+    assert cache.stats()["builds"] == 2 and cache.stats()["hits"] == 1
+
+    cache.invalidate()
+    assert cache.get() is not february
+    assert cache.stats()["builds"] == 3
+
+
+def test_forecast_cache_refresh_recomputes_one_commodity(market, monkeypatch):
+    freeze_month(monkeypatch, market, 2026, 1)
+    cache = market.ForecastCache()
+    cube = cache.get()
+    wheat = market.store.get("wheat")
+
+    class Doubled(market.Commodity):
+        def predict_many(self, values):
+            return market.Commodity.predict_many(self, values) * 2
+
+    doubled = Doubled(market.commodity_dict["wheat"], wheat.regressor)
+    cache.refresh(doubled)
+    refreshed = cache.get()
+    assert refreshed is not cube and cache.stats()["builds"] == 1
+    row = cube.index["wheat"]
+    np.testing.assert_allclose(refreshed.wpi[row], cube.wpi[row] * 2)
+    others = [i for i in range(len(cube.names)) if i != row]
+    np.testing.assert_array_equal(refreshed.wpi[others], cube.wpi[others])
+    assert refreshed.current_price("wheat") == pytest.approx(cube.current_price("wheat") * 2)
+
+
+def test_commodity_profile_resolves_names(client):
+    assert client.get("/commodity/saffron").status_code == 404
+    lower = client.get("/commodity/wheat")
+    upper = client.get("/commodity/WHEAT")
+    assert lower.status_code == upper.status_code == 200
+    assert lower.json()["name"] == upper.json()["name"] == "wheat"
+    assert lower.json() == upper.json()
+
+
+def test_history_range_uses_the_period_index(market, client):
+    commodity = market.store.get("wheat")
+    rows = commodity.history_range(2013, 2014)
+    assert len(rows) == 24 and rows[0][:2] == (1, 2013) and rows[-1][:2] == (12, 2014)
+    assert all(commodity.history[(float(m), float(y))] == wpi for m, y, wpi in rows)
+
+    response = client.get("/history/Wheat", params={"start_year": 2013, "end_year": 2013})
+    assert [label for label, wpi, price in response.json()["history"]][:2] == ["Jan 13", "Feb 13"]
+    assert client.get("/history/wheat", params={"start_year": 2014, "end_year": 2013}).status_code == 400
+    assert client.get("/history/saffron").status_code == 404
+
+
+@pytest.fixture
+def restore_store(market):
+    saved = dict(market.store.commodities)
+    yield
+    market.store.commodities.clear()
+    market.store.commodities.update(saved)
+    market.forecast_cache.invalidate()
+
+
+def test_swap_retrained_skips_a_stale_digest(market, restore_store):
+    from npk.price_prediction.columnar import csv_digest
+    from npk.price_prediction.training import fit_regressor
+    current = market.store.get("wheat")
+    regressor = fit_regressor(current.X, current.Y, {"max_depth": 2})
+
+    # Fitted on contents that an ingest has since replaced
+    market.swap_retrained("wheat", regressor, "0" * 64)
+    assert market.store.get("wheat") is current
+
+    market.swap_retrained("wheat", regressor, csv_digest(market.commodity_dict["wheat"]))
+    assert market.store.get("wheat") is not current
+    assert market.store.get("wheat").regressor is regressor
+
+
+def test_wpi_ingest_refits_the_commodity(market, client, restore_store, monkeypatch, tmp_path):
+    import shutil
+    csv_name = str(tmp_path / "Wheat.csv")
+    shutil.copy(market.commodity_dict["wheat"], csv_name)
+    monkeypatch.setitem(market.commodity_dict, "wheat", csv_name)
+    monkeypatch.setitem(market.ingested_keys, "wheat", set())
+    market.store.replace("wheat", market.Commodity(csv_name))
+    freeze_month(monkeypatch, market, 2026, 1)
+
+    # April 2012 is already in the history
+    response = client.post("/commodity/wheat/wpi", json=[{"Month": 4, "Year": 2012, "Rainfall": 47.5, "WPI": 110}])
+    assert response.status_code == 409
+
+    rows = [
+        {"Month": m, "Year": y, "Rainfall": market.annual_rainfall[m - 1], "WPI": 900}
+        for y in (2026, 2027) for m in range(1, 13)
+    ]
+    response = client.post("/commodity/Wheat/wpi", json=rows)
+    assert response.status_code == 200, response.text
+    assert response.json()["appended"] == 24
+    # Rows waiting on the refit count as present too
+    assert client.post("/commodity/wheat/wpi", json=rows[:1]).status_code == 409
+
+    # The refit executor has one worker, so this waits for the refit
+    market.refit_executor.submit(lambda: None).result()
+    assert client.get("/commodity/wheat/refit").json()["state"] == "done"
+    profile = client.get("/commodity/wheat").json()
+    price = round(900 * market.base["Wheat"] / 100, 2)
+    assert [value for label, value, change in profile["forecast_values"]] == [price] * 12
+    assert len(open(csv_name).read().splitlines()) == len(market.store.get("wheat").Y) + 1
+
+
+def test_rainfall_scenarios_give_ordered_reproducible_bands(client):
+    request = {"scenarios": 200, "months": 3, "commodities": ["wheat", "Paddy"], "seed": 7}
+    response = client.post("/scenarios", json=request)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert len(body["months"]) == 3 and set(body["bands"]) == {"wheat", "paddy"}
+    for bands in body["bands"].values():
+        assert all(p10 <= p50 <= p90 for p10, p50, p90 in zip(bands["p10"], bands["p50"], bands["p90"]))
+    assert client.post("/scenarios", json=request).json()["bands"] == body["bands"]
+
+    assert client.post("/scenarios", json=dict(request, distribution="cauchy")).status_code == 400
+    assert client.post("/scenarios", json=dict(request, percentiles=[[1, 2, 3]])).status_code == 400
+    assert client.post("/scenarios", json=dict(request, commodities=["saffron"])).status_code == 404
+
+
+def test_commodities_endpoint_selects_fields(client):
+    response = client.get("/commodities", params={"names": "wheat, Paddy", "fields": "current_price,max_crop"})
+    assert response.status_code == 200, response.text
+    profiles = response.json()["commodities"]
+    assert [profile["name"] for profile in profiles] == ["wheat", "paddy"]
+    assert all(set(profile) == {"name", "max_crop", "current_price"} for profile in profiles)
+
+    full = client.get("/commodities", params={"names": "wheat"}).json()["commodities"][0]
+    assert not any(field.endswith(("_x", "_y")) for field in full)
+    single = client.get("/commodity/wheat").json()
+    assert all(full[field] == single[field] for field in full)
+
+    assert client.get("/commodities", params={"names": "wheat", "fields": "colour"}).status_code == 400
+    assert client.get("/commodities", params={"names": "wheat,saffron"}).status_code == 404
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from conftest import DATASET_PATH, CSV_FEATURE_COLUMNS
+from npk.soil_index import SoilProfileIndex
+
+
+def test_query_matches_brute_force_zscore_distance():
+    dataset = pd.read_csv(DATASET_PATH)
+    features = dataset[CSV_FEATURE_COLUMNS].to_numpy(dtype=float)
+    index = SoilProfileIndex.from_csv(DATASET_PATH, CSV_FEATURE_COLUMNS)
+
+    rng = np.random.default_rng(0)
+    # Dataset rows, perturbed rows and points outside the observed ranges
+    queries = np.vstack([
+        features[rng.integers(0, len(features), 10)],
+        features[rng.integers(0, len(features), 10)] * rng.uniform(0.9, 1.1, (10, features.shape[1])),
+        features.max(axis=0) * 1.5,
+    ])
+    zscores = (features - features.mean(axis=0)) / features.std(axis=0)
+    k = 7
+
+    for query, neighbors in zip(queries, index.query(queries, k)):
+        distances = np.sqrt((((query - features.mean(axis=0)) / features.std(axis=0) - zscores) ** 2).sum(axis=1))
+        expected = np.sort(distances)[:k]
+        np.testing.assert_allclose([found["distance"] for found in neighbors], expected, rtol=1e-9)
+        for found in neighbors:
+            row = np.array([found[column] for column in CSV_FEATURE_COLUMNS])
+            # Each neighbour is a dataset row at the distance reported for it
+            matches = np.flatnonzero((features == row).all(axis=1))
+            assert len(matches) and np.isclose(distances[matches], found["distance"], rtol=1e-9).any()
+            assert found["label"] in set(dataset["label"].iloc[matches])
+
+
+def test_k_is_capped_at_the_dataset_size():
+    features = np.array([[0.0, 1.0], [1.0, 1.0], [5.0, 1.0]])
+    index = SoilProfileIndex(features, np.array(["a", "b", "c"]), ["x", "y"])
+    neighbors = index.query([[0.9, 1.0]], k=10)[0]
+    assert [found["label"] for found in neighbors] == ["b", "a", "c"]
+    # A constant column does not divide by zero
+    assert all(np.isfinite(found["distance"]) for found in neighbors)
@@ -0,0 +1,61 @@
+import json
+import asyncio
+from npk.price_prediction.ticker_stream import TickerHub
+
+
+def parse(message):
+    event, data = message.strip().split("\n")
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+def test_slow_subscriber_is_resynced_with_a_snapshot():
+    tables = [[["Feb 26", "wheat", 100.0], ["Mar 26", "paddy", 50.0]]]
+    hub = TickerHub(lambda: tables[-1], interval=3600, queue_size=2)
+
+    async def scenario():
+        slow = await hub.subscribe()
+        fast = await hub.subscribe()
+        received = [await fast.get()]
+
+        tables.append([["Feb 26", "wheat", 101.0], ["Mar 26", "paddy", 50.0]])
+        await hub.refresh()
+        received.append(await fast.get())
+        tables.append([["Feb 26", "wheat", 102.0], ["Mar 26", "paddy", 49.0]])
+        await hub.refresh()
+        received.append(await fast.get())
+
+        # The slow client read nothing, so its queue overflowed
+        backlog = [slow.get_nowait() for _ in range(slow.qsize())]
+        hub._task.cancel()
+        return received, backlog
+
+    received, backlog = asyncio.run(scenario())
+    assert [parse(message) for message in received] == [
+        ("snapshot", tables[0]),
+        ("delta", [[0, 2, 101.0]]),
+        ("delta", [[0, 2, 102.0], [1, 2, 49.0]]),
+    ]
+    assert [parse(message) for message in backlog] == [("snapshot", tables[-1])]
+    assert hub.stats()["resyncs"] == 1 and hub.stats()["broadcasts"] == 2
+
+
+def test_unchanged_table_is_not_broadcast_and_reshaped_table_is_a_snapshot():
+    tables = [[["Feb 26", "wheat", 100.0]]]
+    hub = TickerHub(lambda: tables[-1], interval=3600)
+
+    async def scenario():
+        queue = await hub.subscribe()
+        queue.get_nowait()
+        await hub.refresh()
+        unchanged = queue.qsize()
+        tables.append([["Feb 26", "wheat", 100.0], ["Mar 26", "paddy", 50.0]])
+        await hub.refresh()
+        message = queue.get_nowait()
+        hub.unsubscribe(queue)
+        hub._task.cancel()
+        return unchanged, message
+
+    unchanged, message = asyncio.run(scenario())
+    assert unchanged == 0
+    assert parse(message) == ("snapshot", tables[-1])
+    assert hub.stats()["connections"] == 0
@@ -0,0 +1,34 @@
+import numpy as np
+from npk.price_prediction import training
+from npk.price_prediction.training import load_or_train, training_params
+
+
+def write_csv(path, rows):
+    path.write_text("Month,Year,Rainfall,WPI\n" + "".join(f"{m},{y},{r},{w}\n" for m, y, r, w in rows))
+
+
+def test_regressor_is_cached_until_the_data_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(training, "MODEL_CACHE_DIR", tmp_path / "models")
+    csv_name = tmp_path / "Wheat.csv"
+    rows = [(m, y, 10.0 * m, 100.0 + m + y - 2012) for y in (2012, 2013) for m in range(1, 13)]
+    write_csv(csv_name, rows)
+    X = np.array([row[:3] for row in rows])
+    Y = np.array([row[3] for row in rows])
+    params = training_params("Wheat")
+
+    regressor, trained = load_or_train(str(csv_name), X, Y, params)
+    assert trained
+    cached, trained = load_or_train(str(csv_name), X, Y, params)
+    assert not trained
+    np.testing.assert_array_equal(cached.predict(X), regressor.predict(X))
+
+    # New rows change the CSV hash: retrain and drop the stale artifact
+    write_csv(csv_name, rows + [(1, 2014, 10.0, 200.0)])
+    _, trained = load_or_train(str(csv_name), X, Y, params)
+    assert trained
+    assert len(list((tmp_path / "models").glob("Wheat-*.pkl"))) == 1
+
+
+def test_training_params_are_reproducible():
+    assert training_params("Wheat") == training_params("Wheat")
+    assert 7 <= training_params("Wheat")["max_depth"] <= 17
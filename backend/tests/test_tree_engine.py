@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier
+from npk.tree_engine import CompiledTreeClassifier, check_parity, load_engine
+from conftest import DATASET_PATH, CSV_FEATURE_COLUMNS
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    frame = pd.read_csv(DATASET_PATH)
+    return frame[CSV_FEATURE_COLUMNS].to_numpy(dtype=float), frame["label"]
+
+
+def test_decision_tree_parity(crop_classifier, dataset):
+    X, _ = dataset
+    assert check_parity(CompiledTreeClassifier(crop_classifier), crop_classifier, X) == 0
+
+
+def test_random_forest_parity(dataset):
+    X, y = dataset
+    forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    # Off-sample rows too, so ties between trees are exercised
+    jittered = X + np.random.default_rng(0).normal(0, 5, X.shape)
+    assert check_parity(CompiledTreeClassifier(forest), forest, np.vstack([X, jittered])) == 0
+
+
+def test_load_engine_uses_compiled_trees(crop_classifier):
+    assert isinstance(load_engine(crop_classifier), CompiledTreeClassifier)
+
+
+def test_unsupported_ensembles_fall_back_to_sklearn(dataset):
+    X, y = dataset
+    boosted = AdaBoostClassifier(n_estimators=5, algorithm="SAMME", random_state=0).fit(X, y)
+    with pytest.raises(ValueError):
+        CompiledTreeClassifier(boosted)
+    assert load_engine(boosted) is boosted
+
+
+def test_non_finite_input_is_rejected(crop_classifier, dataset):
+    X, _ = dataset
+    rows = X[:3].copy()
+    rows[1, 2] = np.nan
+    with pytest.raises(ValueError):
+        CompiledTreeClassifier(crop_classifier).predict(rows)